@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
 
 application = get_asgi_application()
+
+# Periodic purge of expired tokens, if TOKEN_COMPACTION_INTERVAL is set
+from users.token_compaction import scheduler  # noqa: E402
+
+scheduler.start()
@@ -0,0 +1,127 @@
+"""
+Path-scoped middleware for the ``'lean'`` ``MIDDLEWARE_PROFILE``.
+
+The JSON API is authenticated with JWTs and exempt from CSRF, so loading a
+session, the messages storage and ``request.user`` only costs time there.
+``PathScopedMiddleware`` runs ``BROWSER_MIDDLEWARE`` for every path except
+those starting with one of ``LEAN_MIDDLEWARE_PATHS``, which go straight to
+the view.
+
+Django only calls the ``process_view``, ``process_template_response`` and
+``process_exception`` hooks of ``MIDDLEWARE`` entries, so those of the
+browser middleware are forwarded from here. The middleware works in both
+sync (WSGI) and async (ASGI) mode, and lean paths never leave the mode the
+server runs in.
+"""
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def adapt(handler, is_async):
+    """Return ``handler`` (sync or async) as a callable of the given mode."""
+    if iscoroutinefunction(handler) == is_async:
+        return handler
+    return sync_to_async(handler, thread_sensitive=True) if is_async else async_to_sync(handler)
+
+
+class PathScopedMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.lean_paths = tuple(settings.LEAN_MIDDLEWARE_PATHS)
+
+        # Build the wrapped chain the way Django's handler does
+        handler = get_response
+        handler_is_async = self.is_async
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+        for middleware_path in reversed(settings.BROWSER_MIDDLEWARE):
+            middleware_class = import_string(middleware_path)
+            if not handler_is_async and getattr(middleware_class, 'sync_capable', True):
+                middleware_is_async = False
+            else:
+                middleware_is_async = getattr(middleware_class, 'async_capable', False)
+            middleware = middleware_class(adapt(handler, middleware_is_async))
+            if hasattr(middleware, 'process_view'):
+                self.view_middleware.insert(0, middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self.template_response_middleware.append(middleware.process_template_response)
+            if hasattr(middleware, 'process_exception'):
+                self.exception_middleware.append(middleware.process_exception)
+            handler = middleware
+            handler_is_async = middleware_is_async
+        self.browser_handler = adapt(handler, self.is_async)
+
+        # The forwarded hooks are sync; in async mode only browser paths pay
+        # for the thread switch. Django always calls process_exception
+        # synchronously.
+        if self.is_async:
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+        else:
+            self.process_view = self._process_view
+            self.process_template_response = self._process_template_response
+
+    def is_lean(self, request):
+        return request.path_info.startswith(self.lean_paths)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if self.is_lean(request):
+            return self.get_response(request)
+        return self.browser_handler(request)
+
+    async def __acall__(self, request):
+        if self.is_lean(request):
+            return await self.get_response(request)
+        return await self.browser_handler(request)
+
+    async def _aprocess_view(self, request, *args):
+        if self.is_lean(request):
+            return None
+        return await sync_to_async(self._process_view)(request, *args)
+
+    async def _aprocess_template_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        return await sync_to_async(self._process_template_response)(request, response)
+
+    def _process_view(self, request, view_func, view_args, view_kwargs):
+        # CsrfViewMiddleware does its checking here
+        if self.is_lean(request):
+            return None
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def _process_template_response(self, request, response):
+        if self.is_lean(request):
+            return response
+        for process_template_response in self.template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if self.is_lean(request):
+            return None
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
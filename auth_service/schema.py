@@ -0,0 +1,80 @@
+"""
+Precomputed OpenAPI schema.
+
+Generating the schema introspects every view and serializer, so it is done
+once: ``manage.py generate_schema`` writes ``swagger.json``/``swagger.yaml``
+to ``SCHEMA_ARTIFACT_DIR`` at build time (served by WhiteNoise under
+``/static/openapi/``), and ``/swagger.json``/``/swagger.yaml`` serve the
+same bytes from memory, reading the artifact if present or generating it on
+first use. Responses carry an ETag so clients revalidate with a 304.
+"""
+
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import include, path
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+API_INFO = openapi.Info(
+    title="Django Auth Service API",
+    default_version='v1',
+    description="A comprehensive authentication service built with Django",
+    terms_of_service="https://www.billstation.com/terms/",
+    contact=openapi.Contact(email="contact@billstation.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+API_PATTERNS = [path('api/v1/', include('users.urls'))]
+
+FORMATS = {
+    '.json': (OpenAPICodecJson, 'application/json'),
+    '.yaml': (OpenAPICodecYaml, 'application/yaml'),
+}
+
+_schemas = {}
+_lock = threading.Lock()
+
+
+def generate_schema(fmt):
+    """Render the public schema of the API in ``fmt`` ('.json' or '.yaml')."""
+    generator = OpenAPISchemaGenerator(API_INFO, patterns=API_PATTERNS)
+    schema = generator.get_schema(request=None, public=True)
+    codec_class, _ = FORMATS[fmt]
+    return codec_class(validators=[]).encode(schema)
+
+
+def artifact_path(fmt):
+    return os.path.join(settings.SCHEMA_ARTIFACT_DIR, f'swagger{fmt}')
+
+
+def get_schema(fmt):
+    """``(body, etag)`` for ``fmt``, loaded or generated once per process."""
+    if fmt not in _schemas:
+        with _lock:
+            if fmt not in _schemas:
+                try:
+                    with open(artifact_path(fmt), 'rb') as f:
+                        body = f.read()
+                except FileNotFoundError:
+                    body = generate_schema(fmt)
+                _schemas[fmt] = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+    return _schemas[fmt]
+
+
+def _schema_etag(request, format):
+    return get_schema(format)[1]
+
+
+@require_GET
+@cache_control(public=True, max_age=settings.SCHEMA_MAX_AGE)
+@condition(etag_func=_schema_etag)
+def schema_view(request, format):
+    body, _ = get_schema(format)
+    return HttpResponse(body, content_type=FORMATS[format][1])
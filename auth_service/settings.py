@@ -9,6 +9,9 @@ import environ
 import os
 from datetime import timedelta
 
+import django
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,16 +49,57 @@ INSTALLED_APPS = [
     'users',
 ]
 
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',   # ✅ must be here
-    'corsheaders.middleware.CorsMiddleware',
+# Middleware profile:
+#   'full' - session, CSRF, auth and messages middleware on every request
+#   'lean' - only for paths outside LEAN_MIDDLEWARE_PATHS (e.g. the admin);
+#            the JWT-authenticated API skips them
+MIDDLEWARE_PROFILE = env('MIDDLEWARE_PROFILE', default='lean')
+LEAN_MIDDLEWARE_PATHS = ('/api/v1/', '/health/', '/ping/', '/metrics')
+BROWSER_MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
 ]
+MIDDLEWARE_PROFILES = {
+    'full': [
+        'django.middleware.security.SecurityMiddleware',
+        'whitenoise.middleware.WhiteNoiseMiddleware',   # ✅ must be here
+        'corsheaders.middleware.CorsMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ],
+    'lean': [
+        'django.middleware.security.SecurityMiddleware',
+        'whitenoise.middleware.WhiteNoiseMiddleware',
+        'corsheaders.middleware.CorsMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'auth_service.middleware.PathScopedMiddleware',
+    ],
+}
+MIDDLEWARE = MIDDLEWARE_PROFILES[MIDDLEWARE_PROFILE]
+
+# Prometheus metrics at /metrics (users.metrics), on by default when
+# prometheus_client is installed. Under gunicorn also set
+# PROMETHEUS_MULTIPROC_DIR so that every worker's samples are reported.
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; with
+# no token set /metrics is only served when DEBUG is on.
+try:
+    import prometheus_client  # noqa: F401
+    _default_metrics = True
+except ImportError:
+    _default_metrics = False
+METRICS = env.bool('METRICS', default=_default_metrics)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+if METRICS:
+    MIDDLEWARE = ['users.metrics.MetricsMiddleware', *MIDDLEWARE]
+
+# The admin checks look for these in MIDDLEWARE itself; in the lean profile
+# they run inside PathScopedMiddleware for the admin's paths
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410'] if MIDDLEWARE_PROFILE == 'lean' else []
 
 ROOT_URLCONF = 'auth_service.urls'
 
@@ -77,6 +121,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'auth_service.wsgi.application'
 
+# Serve the auth endpoints with the async views in users.async_views.
+# Only useful under an ASGI server (uvicorn workers).
+API_ASYNC_VIEWS = env.bool('API_ASYNC_VIEWS', default=False)
+
 # Database
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
@@ -91,13 +139,171 @@ else:
         }
     }
 
-# Cache
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Connection reuse: keep connections open for DATABASE_CONN_MAX_AGE seconds
+# (0 closes them after every request) and check them before reuse.
+# DATABASE_STATEMENT_TIMEOUT (ms, Postgres, 0 = none) bounds every query
+# except those of migrations (see users.db).
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=600)
+DATABASE_CONN_HEALTH_CHECKS = env.bool('DATABASE_CONN_HEALTH_CHECKS', default=True)
+DATABASE_STATEMENT_TIMEOUT = env.int('DATABASE_STATEMENT_TIMEOUT', default=5000)
+# psycopg 3 connection pool (Django 5.1+); replaces persistent connections
+DATABASE_POOL = env.bool('DATABASE_POOL', default=False)
+DATABASE_POOL_MIN_SIZE = env.int('DATABASE_POOL_MIN_SIZE', default=2)
+DATABASE_POOL_MAX_SIZE = env.int('DATABASE_POOL_MAX_SIZE', default=10)
+DATABASE_POOL_TIMEOUT = env.float('DATABASE_POOL_TIMEOUT', default=5.0)
+
+DATABASES['default']['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+DATABASES['default']['CONN_HEALTH_CHECKS'] = DATABASE_CONN_HEALTH_CHECKS
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    _db_options = DATABASES['default'].setdefault('OPTIONS', {})
+    if DATABASE_STATEMENT_TIMEOUT:
+        # Keep any options given in DATABASE_URL (e.g. a search_path)
+        _db_options['options'] = ' '.join(filter(None, (
+            _db_options.get('options'), f'-c statement_timeout={DATABASE_STATEMENT_TIMEOUT}',
+        )))
+    if DATABASE_POOL:
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured('DATABASE_POOL requires Django 5.1+ and psycopg 3')
+        _db_options['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': DATABASE_POOL_TIMEOUT,
+        }
+        # The pool keeps the connections; Django must close (return) them
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# Read replicas (users.replicas): comma-separated database URLs. User row
+# reads (profile, login, token user lookups) go to a replica at most
+# REPLICA_MAX_LAG seconds behind (checked every REPLICA_CHECK_INTERVAL
+# seconds), except for REPLICA_PIN_SECONDS after the user was saved and after
+# a write in the same request. Other reads (e.g. the token blacklist), writes
+# and migrations always use the primary.
+DATABASE_REPLICA_URLS = env.list('DATABASE_REPLICA_URLS', default=[])
+REPLICA_MAX_LAG = env.float('REPLICA_MAX_LAG', default=5.0)
+REPLICA_CHECK_INTERVAL = env.int('REPLICA_CHECK_INTERVAL', default=10)
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=15)
+# Seconds; bounds the lag check (and reads) when a replica host is unreachable
+REPLICA_CONNECT_TIMEOUT = env.int('REPLICA_CONNECT_TIMEOUT', default=2)
+
+for _index, _url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    _replica = env.db_url_config(_url)
+    for _key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+        if _key in DATABASES['default']:
+            _replica[_key] = DATABASES['default'][_key]
+    _replica['OPTIONS'] = {**DATABASES['default'].get('OPTIONS', {}), **_replica.get('OPTIONS', {})}
+    if _replica['ENGINE'] == 'django.db.backends.postgresql':
+        _replica['OPTIONS'].setdefault('connect_timeout', REPLICA_CONNECT_TIMEOUT)
+    # Tests run against the primary only
+    _replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{_index}'] = _replica
+if DATABASE_REPLICA_URLS:
+    DATABASE_ROUTERS = ['users.replicas.ReplicaRouter']
+
+# Redis (users.redis_client): bounded blocking pool, timeouts in seconds,
+# retries with backoff and a circuit breaker that falls back to CACHES.
+REDIS_URL = env('REDIS_URL', default='')
+REDIS_MAX_CONNECTIONS = env.int('REDIS_MAX_CONNECTIONS', default=50)
+REDIS_POOL_TIMEOUT = env.float('REDIS_POOL_TIMEOUT', default=1.0)
+REDIS_SOCKET_CONNECT_TIMEOUT = env.float('REDIS_SOCKET_CONNECT_TIMEOUT', default=1.0)
+REDIS_SOCKET_TIMEOUT = env.float('REDIS_SOCKET_TIMEOUT', default=1.0)
+REDIS_HEALTH_CHECK_INTERVAL = env.int('REDIS_HEALTH_CHECK_INTERVAL', default=30)
+REDIS_RETRY_ATTEMPTS = env.int('REDIS_RETRY_ATTEMPTS', default=2)
+REDIS_CIRCUIT_FAILURE_THRESHOLD = env.int('REDIS_CIRCUIT_FAILURE_THRESHOLD', default=5)
+REDIS_CIRCUIT_RESET_TIMEOUT = env.int('REDIS_CIRCUIT_RESET_TIMEOUT', default=30)
+
+# Cache: shared Redis cache when REDIS_URL is set; per-process LocMemCache
+# is only meant for local development. The 'fallback' alias holds what
+# users.redis_client writes while Redis is down (password reset tokens,
+# tombstones, blacklist entries, throttle state), so it must not depend on
+# Redis: it is a per-worker LocMemCache.
+CACHE_SERIALIZERS = {
+    'pickle': 'django.core.cache.backends.redis.RedisSerializer',
+    'compressed': 'users.cache_serializers.CompressedPickleSerializer',
+    'json': 'users.cache_serializers.JSONSerializer',
+}
+CACHE_SERIALIZER = env('CACHE_SERIALIZER', default='compressed')
+# 'compressed': zlib level (1 fastest .. 9 smallest) for values of at least
+# CACHE_COMPRESS_MIN_LENGTH bytes
+CACHE_COMPRESS_MIN_LENGTH = env.int('CACHE_COMPRESS_MIN_LENGTH', default=1024)
+CACHE_COMPRESS_LEVEL = env.int('CACHE_COMPRESS_LEVEL', default=6)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('CACHE_REDIS_URL', default=REDIS_URL),
+            'KEY_PREFIX': env('CACHE_KEY_PREFIX', default='auth'),
+            'TIMEOUT': env.int('CACHE_TIMEOUT', default=300),
+            'OPTIONS': {
+                'serializer': CACHE_SERIALIZERS[CACHE_SERIALIZER],
+                'pool_class': 'redis.BlockingConnectionPool',
+                'max_connections': REDIS_MAX_CONNECTIONS,
+                'timeout': REDIS_POOL_TIMEOUT,
+                'socket_connect_timeout': REDIS_SOCKET_CONNECT_TIMEOUT,
+                'socket_timeout': REDIS_SOCKET_TIMEOUT,
+                'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+                'retry_on_timeout': True,
+            },
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
+    }
+CACHES['fallback'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'redis-fallback',
+}
+
+# Authenticated user cache (JWT_AUTH_MODE=cached): per-worker LRU + Redis
+USER_CACHE_LOCAL_SIZE = env.int('USER_CACHE_LOCAL_SIZE', default=1024)
+USER_CACHE_LOCAL_TTL = env.int('USER_CACHE_LOCAL_TTL', default=10)
+USER_CACHE_REDIS_TTL = env.int('USER_CACHE_REDIS_TTL', default=300)
+USER_CACHE_KEY_PREFIX = 'user_cache:'
+
+# Buffered last_login writes: 'memory' (per worker) or 'redis' (shared)
+LAST_LOGIN_BUFFER = env('LAST_LOGIN_BUFFER', default='memory')
+LAST_LOGIN_FLUSH_INTERVAL = env.int('LAST_LOGIN_FLUSH_INTERVAL', default=30)
+LAST_LOGIN_FLUSH_BATCH_SIZE = env.int('LAST_LOGIN_FLUSH_BATCH_SIZE', default=500)
+
+# Password hashing: 'pbkdf2' (Django default), 'argon2' (Argon2id) or 'scrypt'.
+# The other hashers stay listed so existing hashes keep verifying and are
+# upgraded to the preferred one on the next successful login.
+PASSWORD_HASHER = env('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'users.hashers.TunedScryptPasswordHasher',
 }
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Argon2id costs (memory in KiB) and scrypt costs (work factor must be a power of 2)
+ARGON2_TIME_COST = env.int('ARGON2_TIME_COST', default=2)
+ARGON2_MEMORY_COST = env.int('ARGON2_MEMORY_COST', default=102400)
+ARGON2_PARALLELISM = env.int('ARGON2_PARALLELISM', default=8)
+SCRYPT_WORK_FACTOR = env.int('SCRYPT_WORK_FACTOR', default=2 ** 14)
+SCRYPT_BLOCK_SIZE = env.int('SCRYPT_BLOCK_SIZE', default=8)
+SCRYPT_PARALLELISM = env.int('SCRYPT_PARALLELISM', default=1)
+
+# Offload password hashing to a per-worker process pool. Requests beyond
+# PASSWORD_HASHING_MAX_PENDING queued hashes get an immediate 503.
+PASSWORD_HASHING_POOL = env.bool('PASSWORD_HASHING_POOL', default=False)
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=os.cpu_count() or 1)
+PASSWORD_HASHING_MAX_PENDING = env.int('PASSWORD_HASHING_MAX_PENDING', default=PASSWORD_HASHING_WORKERS * 4)
+PASSWORD_HASHING_TIMEOUT = env.int('PASSWORD_HASHING_TIMEOUT', default=10)
+
+AUTHENTICATION_BACKENDS = ['users.backends.ModelBackend']
+
+# Bulk registration endpoint: rows per upload (hashed within the request, so
+# keep it small; larger files go through manage.py import_users) and rows per
+# INSERT
+BULK_REGISTRATION_MAX_ROWS = env.int('BULK_REGISTRATION_MAX_ROWS', default=200)
+BULK_REGISTRATION_BATCH_SIZE = env.int('BULK_REGISTRATION_BATCH_SIZE', default=500)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -107,30 +313,85 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# JWT authentication mode:
+#   'database'  - load the User row on every request (default)
+#   'cached'    - resolve the user through the two-tier user cache
+#   'stateless' - build the user from signed token claims, no query
+JWT_AUTH_MODE = env('JWT_AUTH_MODE', default='database')
+JWT_AUTHENTICATION_CLASSES = {
+    'database': 'users.authentication.JWTAuthentication',
+    'cached': 'users.authentication.CachedJWTAuthentication',
+    'stateless': 'users.authentication.StatelessJWTAuthentication',
+}
+
+# Throttling: 'redis' uses the atomic GCRA throttles in users.throttling,
+# 'cache' uses DRF's throttles on top of CACHES.
+THROTTLE_BACKEND = env('THROTTLE_BACKEND', default='redis' if REDIS_URL else 'cache')
+THROTTLE_CLASSES = {
+    'cache': [
+        'rest_framework.throttling.AnonRateThrottle',
+        'rest_framework.throttling.UserRateThrottle',
+        'rest_framework.throttling.ScopedRateThrottle',
+    ],
+    'redis': [
+        'users.throttling.AnonGCRAThrottle',
+        'users.throttling.UserGCRAThrottle',
+        'users.throttling.ScopedGCRAThrottle',
+    ],
+}
+
 # REST Framework
+# JSON encoding for API responses and request bodies: 'orjson' (default
+# when the package is installed) or 'stdlib'
+try:
+    import orjson  # noqa: F401
+    _default_json_backend = 'orjson'
+except ImportError:
+    _default_json_backend = 'stdlib'
+JSON_BACKEND = env('JSON_BACKEND', default=_default_json_backend)
+JSON_RENDERER_CLASSES = {
+    'stdlib': 'rest_framework.renderers.JSONRenderer',
+    'orjson': 'users.renderers.ORJSONRenderer',
+}
+JSON_PARSER_CLASSES = {
+    'stdlib': 'rest_framework.parsers.JSONParser',
+    'orjson': 'users.renderers.ORJSONParser',
+}
+
+# Accepted request bodies: 'json' only, or 'all' (JSON, form, multipart).
+# Views that take uploads set their own parser_classes.
+PARSER_PROFILE = env('PARSER_PROFILE', default='json')
+PARSER_PROFILES = {
+    'json': [
+        JSON_PARSER_CLASSES[JSON_BACKEND],
+    ],
+    'all': [
+        JSON_PARSER_CLASSES[JSON_BACKEND],
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        JWT_AUTHENTICATION_CLASSES[JWT_AUTH_MODE],
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
-    ],
+    'DEFAULT_THROTTLE_CLASSES': THROTTLE_CLASSES[THROTTLE_BACKEND],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
-        'user': '1000/hour'
+        'user': '1000/hour',
+        # Per-endpoint scopes (view.throttle_scope)
+        'login': env('THROTTLE_RATE_LOGIN', default='10/minute'),
+        'password_reset': env('THROTTLE_RATE_PASSWORD_RESET', default='5/minute'),
     },
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ],
-    'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
-        'rest_framework.parsers.FormParser',
-        'rest_framework.parsers.MultiPartParser',
+        JSON_RENDERER_CLASSES[JSON_BACKEND],
     ],
+    'DEFAULT_PARSER_CLASSES': PARSER_PROFILES[PARSER_PROFILE],
+    'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
 # JWT
@@ -139,7 +400,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=env.int('JWT_REFRESH_TOKEN_LIFETIME', default=7)),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login is written in batches by users.last_login instead
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'VERIFYING_KEY': None,
@@ -147,8 +409,38 @@ SIMPLE_JWT = {
     'ISSUER': None,
     'JWK_URL': None,
     'LEEWAY': 0,
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
+    'AUTH_TOKEN_CLASSES': ('users.tokens.UserAccessToken',),
 }
 
+# Asymmetric signing: a directory of <kid>.pem private keys (RSA -> RS256,
+# Ed25519 -> EdDSA) replaces HS256/SECRET_KEY and is published at
+# /.well-known/jwks.json. Rescanned every JWT_KEYS_RELOAD_INTERVAL seconds;
+# new keys sign only after JWT_KEY_ACTIVATION_DELAY seconds.
+JWT_KEYS_DIR = env('JWT_KEYS_DIR', default='')
+JWT_KEYS_RELOAD_INTERVAL = env.int('JWT_KEYS_RELOAD_INTERVAL', default=30)
+JWT_KEY_ACTIVATION_DELAY = env.int('JWT_KEY_ACTIVATION_DELAY', default=600)
+JWKS_MAX_AGE = env.int('JWKS_MAX_AGE', default=300)
+
+# Refresh token blacklist: 'database' (simplejwt's SQL tables) or 'redis'
+# (one expiring key per jti; move existing entries with
+# manage.py migrate_blacklist_to_redis)
+JWT_BLACKLIST_BACKEND = env('JWT_BLACKLIST_BACKEND', default='database')
+
+# Expired OutstandingToken/BlacklistedToken rows are purged by
+# manage.py compact_tokens, or every TOKEN_COMPACTION_INTERVAL seconds by a
+# background thread in each server process (0 disables it)
+TOKEN_COMPACTION_INTERVAL = env.int('TOKEN_COMPACTION_INTERVAL', default=0)
+TOKEN_COMPACTION_CHUNK_SIZE = env.int('TOKEN_COMPACTION_CHUNK_SIZE', default=1000)
+
+# Immediate access token revocation on logout and password reset, checked
+# against a per-worker Bloom filter kept in sync through Redis pub/sub. Off by
+# default without Redis, where revocations would only reach one worker
+JWT_REVOCATION = env.bool('JWT_REVOCATION', default=bool(REDIS_URL))
+JWT_REVOCATION_CAPACITY = env.int('JWT_REVOCATION_CAPACITY', default=100000)
+JWT_REVOCATION_ERROR_RATE = env.float('JWT_REVOCATION_ERROR_RATE', default=0.001)
+JWT_REVOCATION_RESYNC_INTERVAL = env.int('JWT_REVOCATION_RESYNC_INTERVAL', default=300)
+
 # CORS
 if DEBUG:
     CORS_ALLOWED_ORIGINS = [
@@ -257,4 +549,11 @@ SWAGGER_SETTINGS = {
     "USE_STATIC_URL": False,
     "DEFAULT_MODEL_RENDERING": "example",
     "DOC_EXPANSION": "none",
+    # The UI loads the precomputed schema instead of regenerating it
+    "SPEC_URL": ("schema-json", {"format": ".json"}),
 }
+
+# Build-time OpenAPI artifacts (manage.py generate_schema), served by
+# WhiteNoise and used by the in-memory /swagger.json view
+SCHEMA_ARTIFACT_DIR = os.path.join(STATIC_ROOT, 'openapi')
+SCHEMA_MAX_AGE = env.int('SCHEMA_MAX_AGE', default=300)
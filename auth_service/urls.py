@@ -8,12 +8,20 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import redirect   # ✅ Needed for redirect
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework import permissions
 from django.conf import settings
+from auth_service.schema import API_INFO, API_PATTERNS, schema_view as cached_schema_view
+from users.hashing import executor as hashing_executor
+from users.metrics import metrics_view
+from users.redis_client import pool_stats as redis_pool_stats
+from users.replicas import replica_pool
+from users.revocation import revocation_filter
+from users.user_cache import user_cache
+from users.views import jwks_view
 
 DEBUG = settings.DEBUG
 ALLOWED_HOSTS = settings.ALLOWED_HOSTS
+USERS_URLCONF = 'users.async_urls' if settings.API_ASYNC_VIEWS else 'users.urls'
 
 # Health check view for Render
 @csrf_exempt
@@ -28,29 +36,32 @@ def health_check(request):
 def ping(request):
     return JsonResponse({'pong': True}, status=200)
 
-# Debug endpoint
+# Debug endpoint; internal counters are only shown with DEBUG on, use /metrics
+# in production
 @csrf_exempt
 def debug(request):
-    return JsonResponse({
+    data = {
         'status': 'ok',
         'message': 'Django is working',
         'debug': DEBUG,
-        'allowed_hosts': ALLOWED_HOSTS
-    }, status=200)
+        'allowed_hosts': ALLOWED_HOSTS,
+    }
+    if DEBUG:
+        data.update({
+            'user_cache': user_cache.stats(),
+            'hashing_pool': hashing_executor.stats(),
+            'redis': redis_pool_stats(),
+            'revocation': revocation_filter.stats(),
+            'replicas': replica_pool.stats(),
+        })
+    return JsonResponse(data, status=200)
 
-# Swagger schema view
+# Swagger UI page; the schema itself is served by auth_service.schema
 schema_view = get_schema_view(
-    openapi.Info(
-        title="Django Auth Service API",
-        default_version='v1',
-        description="A comprehensive authentication service built with Django",
-        terms_of_service="https://www.billstation.com/terms/",
-        contact=openapi.Contact(email="contact@billstation.com"),
-        license=openapi.License(name="BSD License"),
-    ),
+    API_INFO,
     public=True,
     permission_classes=(permissions.AllowAny,),
-    patterns=[path('api/v1/', include('users.urls'))],
+    patterns=API_PATTERNS,
 )
 
 urlpatterns = [
@@ -59,15 +70,18 @@ urlpatterns = [
 
     # Admin + API
     path('admin/', admin.site.urls),
-    path('api/v1/', include('users.urls')),
+    path('api/v1/', include(USERS_URLCONF)),
 
     # Health/debug endpoints
     path('health/', health_check, name='health_check'),
     path('ping/', ping, name='ping'),
     path('debug/', debug, name='debug'),
+    path('metrics', metrics_view, name='metrics'),
+
+    # Public keys for downstream token verification
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
 
     # Swagger docs
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$',
-            schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', cached_schema_view, name='schema-json'),
+    path('swagger/', schema_view.with_ui('swagger'), name='schema-swagger-ui'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
 
 application = get_wsgi_application()
+
+# Periodic purge of expired tokens, if TOKEN_COMPACTION_INTERVAL is set
+from users.token_compaction import scheduler  # noqa: E402
+
+scheduler.start()
@@ -15,4 +15,8 @@ python manage.py migrate --noinput
 echo "📁 Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Precompute the OpenAPI schema
+echo "📄 Generating OpenAPI schema..."
+python manage.py generate_schema
+
 echo "✅ Build completed successfully!"
@@ -0,0 +1,27 @@
+"""
+Gunicorn hooks (loaded automatically from the working directory).
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to files
+in that directory (see users.metrics): start without the samples of a
+previous run and drop the live gauges of workers that exit. Only the
+``*.db`` files prometheus_client writes are removed, in case the variable
+points at a directory holding anything else.
+"""
+
+import glob
+import os
+
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
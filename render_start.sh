@@ -14,6 +14,10 @@ echo "📁 Collecting static files..."
 # --clear ensures old static files are removed first
 python manage.py collectstatic --noinput --clear
 
+# Precompute the OpenAPI schema (after --clear, which would remove it)
+echo "📄 Generating OpenAPI schema..."
+python manage.py generate_schema
+
 # Start Gunicorn with WhiteNoise serving static files
 echo "🚀 Starting Gunicorn server..."
 exec gunicorn auth_service.wsgi:application \
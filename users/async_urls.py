@@ -0,0 +1,22 @@
+from django.urls import path
+from . import async_views, views
+
+app_name = 'users'
+
+# Same routes and names as users.urls, with the hot endpoints served by
+# async views (enabled with API_ASYNC_VIEWS).
+urlpatterns = [
+    # Authentication endpoints
+    path('register/', views.UserRegistrationView.as_view(), name='register'),
+    path('register/bulk/', views.BulkUserRegistrationView.as_view(), name='bulk_register'),
+    path('login/', async_views.login_view, name='login'),
+    path('logout/', async_views.logout_view, name='logout'),
+    path('token/refresh/', async_views.token_refresh_view, name='token_refresh'),
+
+    # Password reset endpoints
+    path('password/reset/', async_views.password_reset_request_view, name='password_reset_request'),
+    path('password/reset/confirm/', async_views.password_reset_confirm_view, name='password_reset_confirm'),
+
+    # User profile endpoints
+    path('profile/', async_views.profile_view, name='profile'),
+]
@@ -0,0 +1,277 @@
+"""
+Async (ASGI) implementations of the auth endpoints.
+
+Enabled with ``API_ASYNC_VIEWS`` and served by uvicorn workers, e.g.::
+
+    gunicorn auth_service.asgi:application -k uvicorn.workers.UvicornWorker
+
+Requests waiting on Postgres or Redis then yield the event loop instead of
+pinning a thread. The request/response formats, the configured
+authentication and throttle classes and the per-endpoint throttle scopes
+match ``users.views``; the rest of the DRF machinery (browsable docs,
+content negotiation) is not applied to these views.
+"""
+
+import json
+import secrets
+from functools import wraps
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from . import hashing
+from .authentication import get_db_user
+from .last_login import record_login
+from .metrics import timed
+from .redis_client import (
+    adelete_with_fallback,
+    aget_with_fallback,
+    asetex_with_fallback,
+)
+from .replicas import read_as
+from .responses import auth_data, profile_data
+from .revocation import revocation_filter
+from .serializers import (
+    LoginCredentialsSerializer,
+    LogoutSerializer,
+    PasswordResetConfirmSerializer,
+    PasswordResetRequestSerializer,
+    TokenRefreshSerializer,
+)
+from .token_factory import token_factory
+from .tokens import UserRefreshToken
+from .views import UserProfileView, reset_password
+
+User = get_user_model()
+
+
+class ThrottleRequest:
+    """The parts of a DRF request that throttles read."""
+
+    def __init__(self, request, user=None):
+        self.META = request.META
+        self.user = user if user is not None else AnonymousUser()
+
+
+def check_throttles(request, scope=None, user=None):
+    """
+    Apply every class of ``DEFAULT_THROTTLE_CLASSES`` the way
+    ``APIView.check_throttles`` does, for a view with ``throttle_scope =
+    scope`` and a request made by ``user`` (anonymous if None).
+    """
+    request, view = ThrottleRequest(request, user), SimpleNamespace(throttle_scope=scope)
+    waits = []
+    for throttle_class in drf_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait())
+    if waits:
+        waits = [wait for wait in waits if wait is not None]
+        raise Throttled(max(waits, default=None))
+
+
+async def throttle(request, scope=None, user=None):
+    # A Redis or cache round trip; keep it off the event loop
+    await sync_to_async(check_throttles, thread_sensitive=False)(request, scope, user)
+
+
+def async_api_view(*methods, throttle_scope=None, authenticated=False):
+    """
+    Restrict an async view to ``methods``, exempt it from CSRF, apply the
+    throttles and render DRF exceptions as JSON (Django 4.2's own decorators
+    wrap async views in sync functions, so they can't be used here).
+
+    Views that are ``authenticated`` throttle as their user, so they call
+    ``authenticate()`` (which applies the throttles) themselves.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'}, status=405
+                )
+            try:
+                if not authenticated:
+                    await throttle(request, throttle_scope)
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+                response = JsonResponse(detail, status=exc.status_code)
+                if getattr(exc, 'wait', None):
+                    response['Retry-After'] = '%d' % exc.wait
+                return response
+
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+def parse(request, serializer_class):
+    """Validate the JSON request body; return ``(validated_data, errors)``."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None, {'detail': 'JSON parse error'}
+    serializer = serializer_class(data=data)
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return None, serializer.errors
+
+
+def _authenticate(request, require_db_user):
+    for authenticator_class in drf_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator_class().authenticate(request)
+        if result is not None:
+            user, request.auth = result
+            return get_db_user(user) if require_db_user else user
+    raise AuthenticationFailed(_('Authentication credentials were not provided.'))
+
+
+async def authenticate(request, require_db_user=False, throttle_scope=None):
+    """
+    Authenticate ``request`` with the configured DRF authentication classes
+    (``JWT_AUTH_MODE``), then apply the throttles as the authenticated user.
+    The validated token is stored on ``request.auth``; ``require_db_user``
+    returns the ORM ``User`` even in the stateless mode.
+    """
+    # The user lookup may hit the database or Redis
+    user = await sync_to_async(_authenticate)(request, require_db_user)
+    await throttle(request, throttle_scope, user)
+    return user
+
+
+@async_api_view('POST', throttle_scope='login')
+async def login_view(request):
+    data, errors = parse(request, LoginCredentialsSerializer)
+    if errors:
+        return JsonResponse(errors, status=400)
+
+    with timed('authenticate'):
+        await sync_to_async(read_as)(email=data['email'])
+        try:
+            user = await User.objects.filter_by_email(data['email']).aget()
+        except User.DoesNotExist:
+            # Hash anyway so response timing doesn't reveal unknown emails
+            await hashing.amake_password(data['password'])
+            user = None
+        valid = user is not None and await hashing.acheck_password(user, data['password'])
+    # Like ModelBackend, don't tell inactive accounts apart from wrong passwords
+    if not valid or not user.is_active:
+        return JsonResponse({'non_field_errors': ['Invalid credentials']}, status=400)
+
+    await sync_to_async(record_login)(user)
+    tokens = await sync_to_async(token_factory.issue)(user)
+    return JsonResponse(auth_data('Login successful', user, tokens))
+
+
+@async_api_view('POST')
+async def token_refresh_view(request):
+    data, errors = parse(request, TokenRefreshSerializer)
+    if errors:
+        return JsonResponse(errors, status=400)
+    try:
+        # Token verification consults the blacklist (database or Redis)
+        tokens = await sync_to_async(token_factory.refresh)(data['refresh'])
+    except APIException:
+        # e.g. the blacklist could not be checked (503)
+        raise
+    except Exception:
+        return JsonResponse({'error': 'Invalid refresh token'}, status=400)
+    return JsonResponse(tokens.as_dict())
+
+
+@async_api_view('POST', authenticated=True)
+async def logout_view(request):
+    await authenticate(request)
+    data, errors = parse(request, LogoutSerializer)
+    if errors:
+        return JsonResponse({
+            'message': 'Logout successful',
+            'note': 'Logout completed despite invalid data'
+        })
+
+    await sync_to_async(revocation_filter.revoke_token)(request.auth)
+
+    def blacklist(refresh_token):
+        UserRefreshToken(refresh_token).blacklist()
+
+    if data.get('refresh'):
+        try:
+            await sync_to_async(blacklist)(data['refresh'])
+        except Exception:
+            # If refresh token is invalid, that's okay for logout
+            pass
+    return JsonResponse({
+        'message': 'Logout successful',
+        'note': 'Tokens have been invalidated'
+    })
+
+
+@async_api_view('POST', throttle_scope='password_reset')
+async def password_reset_request_view(request):
+    data, errors = parse(request, PasswordResetRequestSerializer)
+    if errors:
+        return JsonResponse(errors, status=400)
+    try:
+        user = await User.objects.filter_by_email(data['email']).aget()
+    except User.DoesNotExist:
+        # Don't reveal if user exists or not for security
+        return JsonResponse({
+            'message': 'If the email exists, a password reset token has been generated'
+        })
+
+    reset_token = secrets.token_urlsafe(32)
+    cache_key = f"password_reset_{reset_token}"
+    cache_data = json.dumps({'user_id': user.id, 'email': user.email})
+    await asetex_with_fallback(cache_key, 600, cache_data)  # 10 minutes
+
+    return JsonResponse({
+        'message': 'Password reset token generated successfully',
+        'reset_token': reset_token,
+        'expires_in': '10 minutes',
+        'note': 'In production, this token would be sent via email'
+    })
+
+
+@async_api_view('POST', throttle_scope='password_reset')
+async def password_reset_confirm_view(request):
+    data, errors = parse(request, PasswordResetConfirmSerializer)
+    if errors:
+        return JsonResponse(errors, status=400)
+
+    cache_key = f"password_reset_{data['token']}"
+    cached_data = await aget_with_fallback(cache_key)
+    if not cached_data:
+        return JsonResponse({'error': 'Invalid or expired reset token'}, status=400)
+
+    try:
+        if isinstance(cached_data, bytes):
+            cached_data = cached_data.decode('utf-8')
+        user = await User.objects.aget(id=json.loads(cached_data)['user_id'])
+    except (User.DoesNotExist, json.JSONDecodeError):
+        return JsonResponse({'error': 'Invalid reset token'}, status=400)
+
+    # Update password and invalidate previously issued tokens
+    password_hash = await hashing.amake_password(data['new_password'])
+    await sync_to_async(reset_password)(user, password_hash)
+
+    await adelete_with_fallback(cache_key, 600)
+    return JsonResponse({'message': 'Password reset successful'})
+
+
+@async_api_view('GET', 'PUT', 'PATCH', authenticated=True)
+async def profile_view(request):
+    if request.method != 'GET':
+        # Updates are rare; reuse the DRF view and its validation
+        return await sync_to_async(UserProfileView.as_view())(request)
+    user = await authenticate(request, require_db_user=True)
+    return JsonResponse(profile_data(user))
@@ -0,0 +1,175 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import REQUEST_USER_FIELDS
+from .replicas import read_as
+from .revocation import revocation_filter
+
+
+def check_token_version(user, validated_token):
+    """
+    Reject tokens issued before the user's ``token_version`` was bumped
+    (e.g. by a password reset). Tokens without the claim are accepted.
+    """
+    version = validated_token.get('token_version')
+    if version is not None and version != user.token_version:
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+
+def check_revocation(validated_token):
+    """Reject tokens revoked by logout or a password reset (see users.revocation)."""
+    if revocation_filter.is_revoked(validated_token):
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    Default authentication: loads the User row (``REQUEST_USER_FIELDS``
+    only) for every request and checks the token version against it.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        check_revocation(validated_token)
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        read_as(user_id=user_id)
+        fields = REQUEST_USER_FIELDS
+        if api_settings.CHECK_REVOKE_TOKEN:
+            fields += ('password',)
+        try:
+            user = self.user_model.objects.only(*fields).get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code='password_changed'
+            )
+
+        check_token_version(user, validated_token)
+        return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Like ``JWTAuthentication`` but resolves users through
+    ``users.user_cache`` instead of querying the database every time.
+    """
+
+    def get_user(self, validated_token):
+        from .user_cache import user_cache
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        read_as(user_id=user_id)
+        try:
+            user = user_cache.get(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        check_token_version(user, validated_token)
+        return user
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lightweight user built from the signed claims of an access token.
+    Call ``get_user()`` when the full ORM ``User`` is required.
+    """
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def full_name(self):
+        return self.token.get('full_name', '')
+
+    @cached_property
+    def token_version(self):
+        return self.token.get('token_version')
+
+    def __str__(self):
+        return self.email
+
+    def get_username(self):
+        return self.email
+
+    def get_user(self):
+        """
+        Load the database user behind this token, applying the same checks
+        as ``JWTAuthentication``. The result is cached on the instance.
+        """
+        if '_user' not in self.__dict__:
+            self.__dict__['_user'] = JWTAuthentication().get_user(self.token)
+        return self.__dict__['_user']
+
+
+class StatelessJWTAuthentication(authentication.JWTStatelessUserAuthentication):
+    """
+    Authenticate requests from token claims alone, without a database query.
+    The user object is a ``ClaimsUser`` (``SIMPLE_JWT['TOKEN_USER_CLASS']``).
+
+    Only the token version and active flag are checked against the user,
+    read through ``users.user_cache``, which answers from memory once warm.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        check_revocation(validated_token)
+        return validated_token
+
+    def get_user(self, validated_token):
+        from .user_cache import user_cache
+
+        user = super().get_user(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        try:
+            current = user_cache.get(user.id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not current.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        check_token_version(current, validated_token)
+        return user
+
+
+def get_db_user(user):
+    """
+    Return the ORM ``User`` for an authenticated request user, loading it
+    from the database only when the request was authenticated statelessly.
+    """
+    if isinstance(user, ClaimsUser):
+        return user.get_user()
+    return user
@@ -0,0 +1,31 @@
+from django.contrib.auth import backends, get_user_model
+
+from . import hashing
+from .metrics import instrument
+from .replicas import read_as
+
+UserModel = get_user_model()
+
+
+class ModelBackend(backends.ModelBackend):
+    """
+    Django's ``ModelBackend`` with password checks routed through
+    ``users.hashing`` so they can run in the hashing process pool.
+    """
+
+    @instrument('authenticate')
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        read_as(email=username)
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so response timing doesn't reveal unknown emails
+            hashing.make_password(password)
+            return None
+        if hashing.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
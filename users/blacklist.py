@@ -0,0 +1,56 @@
+"""
+Redis-backed refresh token blacklist (``JWT_BLACKLIST_BACKEND = 'redis'``).
+
+Each blacklisted token is one key named after its ``jti`` that expires
+together with the token, so storage never grows beyond the live tokens and
+checks are a single GET instead of a join over the SQL blacklist tables.
+While Redis is unavailable new entries go to the fallback cache (see
+users.redis_client), but checks fail closed: a token that may have been
+blacklisted in Redis is never accepted, the request gets a 503 instead.
+"""
+
+import time
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import redis_client
+from .redis_client import fallback_cache, setex_with_fallback
+
+KEY_PREFIX = 'jwt_blacklist:'
+
+
+def blacklist_key(jti):
+    return f'{KEY_PREFIX}{jti}'
+
+
+def remaining_lifetime(exp):
+    """Seconds until the epoch timestamp ``exp``."""
+    return int(exp - time.time()) + 1
+
+
+def add(jti, exp):
+    ttl = remaining_lifetime(exp)
+    if ttl > 0:
+        setex_with_fallback(blacklist_key(jti), ttl, '1')
+
+
+class BlacklistUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Token blacklist is unavailable, please retry shortly.'
+    default_code = 'blacklist_unavailable'
+    wait = 1  # sent as Retry-After by DRF's exception handler
+
+
+def contains(jti):
+    key = blacklist_key(jti)
+    ok, value = redis_client._call('get', key)
+    if value is not None:
+        return True
+    if not ok and redis_client.redis_client is not None:
+        raise BlacklistUnavailable()
+    # Entries added during an outage only exist in the cache
+    try:
+        return fallback_cache.get(key) is not None
+    except Exception as e:
+        raise BlacklistUnavailable() from e
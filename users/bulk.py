@@ -0,0 +1,152 @@
+"""
+Streaming bulk user registration, shared by the bulk registration endpoint
+and ``manage.py import_users``.
+
+Rows are read lazily from a CSV or JSON Lines file and processed one batch
+at a time: each row is validated with ``BulkUserRegistrationSerializer``,
+emails are checked for duplicates with one query per batch, passwords are
+hashed through a caller-supplied ``map`` (a process pool for parallelism)
+and the batch is written with a single ``bulk_create``. Memory use is
+bounded by the batch size, not the file size.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .serializers import BulkUserRegistrationSerializer
+
+User = get_user_model()
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(stream, fmt):
+    """Yield ``(row_number, data)`` from a text stream; rows are numbered from 1."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif fmt == 'jsonl':
+        number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+class ImportResult:
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.failed = 0
+        self.last_row = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'last_row': self.last_row,
+            'errors': self.errors,
+        }
+
+
+def import_users(rows, batch_size=1000, hash_map=map, skip_until=0,
+                 on_error=None, on_batch=None, max_errors=None):
+    """
+    Create users from ``(row_number, data)`` pairs.
+
+    ``hash_map`` hashes the passwords of a batch (e.g. ``executor.map``),
+    rows numbered up to ``skip_until`` are skipped (to resume an earlier
+    run), ``on_error(row, errors)`` is called for every rejected row and
+    ``on_batch(result)`` after every committed batch.
+    """
+    result = ImportResult(max_errors)
+
+    def reject(row, errors):
+        result.add_error(row, errors)
+        if on_error:
+            on_error(row, errors)
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        valid = []
+        seen = set()
+        for number, data in batch:
+            if number <= skip_until:
+                continue
+            if not isinstance(data, dict):
+                reject(number, {'non_field_errors': ['Malformed row']})
+                continue
+            serializer = BulkUserRegistrationSerializer(data=data)
+            if not serializer.is_valid():
+                reject(number, serializer.errors)
+                continue
+            row = serializer.validated_data
+            row['email'] = User.objects.normalize_email(row['email'])
+            if row['email'].lower() in seen:
+                reject(number, {'email': ['Duplicate email in import file']})
+                continue
+            seen.add(row['email'].lower())
+            valid.append((number, row))
+
+        existing = {
+            email.lower()
+            for email in User.objects.filter_by_emails(seen).values_list('email', flat=True)
+        }
+        new = []
+        for number, row in valid:
+            if row['email'].lower() in existing:
+                reject(number, {'email': ['user with this email address already exists.']})
+            else:
+                new.append((number, row))
+
+        hashes = hash_map(make_password, [row['password'] for _, row in new])
+        users = [
+            (number, User(email=row['email'], full_name=row['full_name'], password=password))
+            for (number, row), password in zip(new, hashes)
+        ]
+        result.created += _insert(users, reject)
+        result.last_row = batch[-1][0]
+        if on_batch:
+            on_batch(result)
+
+    return result
+
+
+def _insert(users, reject):
+    """Insert a batch; if a concurrent signup races us, retry row by row."""
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user for _, user in users])
+        return len(users)
+    except IntegrityError:
+        pass
+    created = 0
+    for number, user in users:
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+            created += 1
+        except IntegrityError:
+            reject(number, {'email': ['user with this email address already exists.']})
+    return created
@@ -0,0 +1,53 @@
+"""
+Value serializers for Django's ``RedisCache`` (``CACHE_SERIALIZER`` setting).
+
+Like Django's ``RedisSerializer``, plain integers are stored unencoded so
+that ``incr``/``decr`` keep working.
+"""
+
+import json
+import pickle
+import zlib
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisSerializer
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class CompressedPickleSerializer(RedisSerializer):
+    """
+    Pickle, then zlib-compress values of at least ``CACHE_COMPRESS_MIN_LENGTH``
+    bytes. Compressed payloads start with 0x78 and pickles with 0x80, so the
+    two are told apart without a marker byte.
+    """
+
+    def __init__(self, protocol=None):
+        super().__init__(protocol)
+        self.min_length = getattr(settings, 'CACHE_COMPRESS_MIN_LENGTH', 1024)
+        self.level = getattr(settings, 'CACHE_COMPRESS_LEVEL', 6)
+
+    def dumps(self, obj):
+        data = super().dumps(obj)
+        if isinstance(data, bytes) and len(data) >= self.min_length:
+            return zlib.compress(data, self.level)
+        return data
+
+    def loads(self, data):
+        if isinstance(data, bytes) and data[:1] == b'\x78':
+            data = zlib.decompress(data)
+        return super().loads(data)
+
+
+class JSONSerializer:
+    """JSON instead of pickle, for caches shared with non-Python readers."""
+
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        return json.dumps(obj, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            return json.loads(data)
@@ -0,0 +1,36 @@
+"""
+Database session helpers.
+
+``DATABASE_STATEMENT_TIMEOUT`` bounds every query made by the web workers,
+which is too short for migrations that build indexes on large tables.
+``disable_statement_timeout`` lifts it for the rest of a session; it runs for
+every ``migrate`` through ``pre_migrate`` (see users.signals), and data
+migrations that scan large tables call it themselves as well.
+
+``CREATE INDEX CONCURRENTLY`` leaves an INVALID index behind when it fails,
+which ``IF NOT EXISTS`` would then keep; ``drop_invalid_index`` removes it
+so that the build can be retried.
+"""
+
+
+def disable_statement_timeout(connection):
+    """Remove the statement timeout for the rest of the session (Postgres only)."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET statement_timeout = 0')
+
+
+def drop_invalid_index(schema_editor, name):
+    """Drop index ``name`` if a failed concurrent build left it INVALID (Postgres only)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid',
+            [name],
+        )
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
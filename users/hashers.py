@@ -0,0 +1,28 @@
+"""
+Password hashers whose cost parameters come from settings.
+
+They keep the algorithm names of Django's built-in hashers, so existing hashes
+still verify, and Django rehashes a password on the next successful login
+whenever the configured costs differ from the stored ones.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id with ``ARGON2_TIME_COST``/``ARGON2_MEMORY_COST``/``ARGON2_PARALLELISM``."""
+
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with ``SCRYPT_WORK_FACTOR``/``SCRYPT_BLOCK_SIZE``/``SCRYPT_PARALLELISM``."""
+
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+    block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', ScryptPasswordHasher.block_size)
+    parallelism = getattr(settings, 'SCRYPT_PARALLELISM', ScryptPasswordHasher.parallelism)
+    # scrypt needs 128 * n * r * p bytes; leave headroom over OpenSSL's 32 MiB default
+    maxmem = 2 * 128 * work_factor * block_size * parallelism
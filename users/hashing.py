@@ -0,0 +1,243 @@
+"""
+Password hashing offloaded to a per-worker process pool.
+
+Registration, login and password reset hash through this module. When
+``PASSWORD_HASHING_POOL`` is on, the work runs in a bounded
+``ProcessPoolExecutor`` shared by all threads of the web worker; once
+``PASSWORD_HASHING_MAX_PENDING`` hashes are queued, further requests are
+rejected with a 503 instead of piling up behind them, as are hashes that take
+longer than ``PASSWORD_HASHING_TIMEOUT`` or are lost with a crashed pool
+process (the pool is then replaced). When it is off, hashing runs inline
+exactly as Django would.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import timed
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please retry shortly.'
+    default_code = 'hashing_pool_saturated'
+    wait = 1  # sent as Retry-After by DRF's exception handler
+
+
+def init_worker():
+    # Spawned (non-forked) pool processes start without Django configured
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'auth_service.settings')
+    django.setup()
+
+
+def _verify(password, encoded):
+    """Return ``(valid, must_update)`` for ``password`` against ``encoded``."""
+    must_update = []
+    valid = hashers.check_password(password, encoded, setter=must_update.append)
+    return valid, bool(must_update)
+
+
+class HashingExecutor:
+    def __init__(self, enabled, workers, max_pending, timeout):
+        self.enabled = enabled
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def _get_executor(self):
+        # Recreate the pool after a fork (e.g. gunicorn --preload)
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=init_worker
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard(self, pool):
+        with self._lock:
+            if self._executor is not pool:
+                return  # already replaced by another thread
+            self._executor = None
+            self.restarts += 1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.pending += 1
+            return True
+
+    def _release(self, future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, fn, *args):
+        if not self._acquire():
+            raise HashingPoolSaturated()
+        try:
+            pool = self._get_executor()
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # A pool process died (e.g. OOM-killed); start a new pool
+                self._discard(pool)
+                future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _timed_out(self, future):
+        # A hash that has started keeps its slot until it finishes
+        future.cancel()
+        self.timeouts += 1
+        return HashingPoolSaturated()
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise self._timed_out(future)
+        except BrokenProcessPool:
+            # The next submit replaces the pool
+            raise HashingPoolSaturated()
+
+    def run(self, fn, *args):
+        if not self.enabled:
+            return fn(*args)
+        return self._result(self.submit(fn, *args))
+
+    async def arun(self, fn, *args):
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(future)
+        except BrokenProcessPool:
+            raise HashingPoolSaturated()
+
+    def map(self, fn, iterable):
+        """
+        Apply ``fn`` across the pool for batch work such as bulk imports.
+        Calls count against ``max_pending`` like any other and at most half
+        of it is used, so requests keep getting slots; raises
+        ``HashingPoolSaturated`` when requests hold every slot.
+        """
+        if not self.enabled:
+            return list(map(fn, iterable))
+        window = max(1, self.max_pending // 2)
+        futures = []
+        in_flight = deque()
+        for item in iterable:
+            while True:
+                if len(in_flight) < window:
+                    try:
+                        future = self.submit(fn, item)
+                        break
+                    except HashingPoolSaturated:
+                        if not in_flight:
+                            raise
+                self._result(in_flight.popleft())
+            futures.append(future)
+            in_flight.append(future)
+        return [self._result(future) for future in futures]
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts,
+        }
+
+
+_workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+executor = HashingExecutor(
+    enabled=getattr(settings, 'PASSWORD_HASHING_POOL', False),
+    workers=_workers,
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', None) or _workers * 4,
+    timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 10),
+)
+
+
+def make_password(password):
+    with timed('password_hash'):
+        return executor.run(hashers.make_password, password)
+
+
+def set_password(user, password):
+    """Equivalent of ``user.set_password()`` that hashes through the pool."""
+    user.password = make_password(password)
+    user._password = password
+
+
+def check_password(user, password):
+    """
+    Equivalent of ``user.check_password()``: verify through the pool and,
+    if the stored hash is outdated, rehash and save only the password.
+    """
+    if not user.has_usable_password() or password is None:
+        return False
+    with timed('password_hash'):
+        valid, must_update = executor.run(_verify, password, user.password)
+    if valid and must_update:
+        set_password(user, password)
+        user._password = None
+        user.save(update_fields=['password'])
+    return valid
+
+
+async def _arun(fn, *args):
+    with timed('password_hash'):
+        if executor.enabled:
+            return await executor.arun(fn, *args)
+        # CPU-bound and free of ORM access, so it needn't share the ORM thread
+        return await sync_to_async(fn, thread_sensitive=False)(*args)
+
+
+async def amake_password(password):
+    return await _arun(hashers.make_password, password)
+
+
+async def aset_password(user, password):
+    user.password = await amake_password(password)
+    user._password = password
+
+
+async def acheck_password(user, password):
+    """Async counterpart of ``check_password()``."""
+    if not user.has_usable_password() or password is None:
+        return False
+    valid, must_update = await _arun(_verify, password, user.password)
+    if valid and must_update:
+        await aset_password(user, password)
+        user._password = None
+        await user.asave(update_fields=['password'])
+    return valid
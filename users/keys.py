@@ -0,0 +1,215 @@
+"""
+Asymmetric JWT signing with a rotating key ring.
+
+With ``JWT_KEYS_DIR`` set, tokens are signed with private keys read from that
+directory instead of HS256 and ``SECRET_KEY``. Every ``<kid>.pem`` file is
+one key: RSA keys sign with RS256, Ed25519 keys with EdDSA, and the ``kid``
+goes in the token header. All keys are published at
+``/.well-known/jwks.json``, so other services can verify tokens themselves.
+
+The directory is rescanned at most every ``JWT_KEYS_RELOAD_INTERVAL``
+seconds, so keys can be rotated without a restart. A new key is published
+right away but is only used for signing once it is
+``JWT_KEY_ACTIVATION_DELAY`` seconds old, which gives verifiers time to
+refresh their JWKS cache. Remove a retired key only after the tokens signed
+with it have expired (``REFRESH_TOKEN_LIFETIME``).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+from jwt.exceptions import InvalidAlgorithmError, InvalidTokenError
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+EMPTY_JWKS = b'{"keys":[]}'
+
+ALGORITHMS = {
+    'RS256': (rsa.RSAPrivateKey, RSAAlgorithm),
+    'EdDSA': (ed25519.Ed25519PrivateKey, OKPAlgorithm),
+}
+
+
+def key_algorithm(private_key):
+    for algorithm, (key_type, _jwt_algorithm) in ALGORITHMS.items():
+        if isinstance(private_key, key_type):
+            return algorithm
+    raise ValueError(f'Unsupported key type: {type(private_key).__name__}')
+
+
+def generate_private_key(algorithm):
+    if algorithm == 'RS256':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == 'EdDSA':
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f'Unsupported algorithm: {algorithm}')
+
+
+def private_key_pem(private_key):
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+class SigningKey:
+    def __init__(self, kid, private_key, created):
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.algorithm = key_algorithm(private_key)
+        self.created = created
+
+    def jwk(self):
+        jwk = ALGORITHMS[self.algorithm][1].to_jwk(self.public_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+
+class KeyRing:
+    def __init__(self, directory, reload_interval, activation_delay):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.activation_delay = activation_delay
+        self.keys = {}
+        self.jwks = EMPTY_JWKS
+        self.etag = None
+        self.reloads = 0
+        self._fingerprint = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        with os.scandir(self.directory) as entries:
+            return sorted(
+                (entry.name, entry.stat().st_mtime)
+                for entry in entries
+                if entry.name.endswith('.pem') and entry.is_file()
+            )
+
+    def refresh(self, force=False):
+        """Reload the keys if the directory changed (checked every ``reload_interval``)."""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                fingerprint = self._scan()
+            except OSError as e:
+                logger.error('Cannot read JWT key directory %s: %s', self.directory, e)
+                return
+            if fingerprint == self._fingerprint:
+                return
+            keys = {}
+            for name, mtime in fingerprint:
+                kid = name[:-len('.pem')]
+                try:
+                    with open(os.path.join(self.directory, name), 'rb') as f:
+                        private_key = serialization.load_pem_private_key(f.read(), password=None)
+                    keys[kid] = SigningKey(kid, private_key, mtime)
+                except (OSError, ValueError, TypeError) as e:
+                    logger.error('Skipping JWT key %s: %s', name, e)
+            self.keys = keys
+            self.jwks = json.dumps(
+                {'keys': [key.jwk() for key in keys.values()]}, separators=(',', ':')
+            ).encode()
+            self.etag = '"%s"' % hashlib.sha256(self.jwks).hexdigest()[:32]
+            self._fingerprint = fingerprint
+            self.reloads += 1
+            logger.info('Loaded %d JWT signing key(s)', len(keys))
+
+    def get(self, kid):
+        self.refresh()
+        return self.keys.get(kid)
+
+    def signing_key(self):
+        """The newest key old enough to be active, else the newest key."""
+        self.refresh()
+        if not self.keys:
+            raise TokenBackendError(_('No JWT signing keys available'))
+        keys = sorted(self.keys.values(), key=lambda key: key.created, reverse=True)
+        cutoff = time.time() - self.activation_delay
+        return next((key for key in keys if key.created <= cutoff), keys[0])
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """simplejwt token backend that signs and verifies with a ``KeyRing``."""
+
+    def __init__(self, key_ring, **kwargs):
+        # The algorithm is chosen per key; RS256 only satisfies the base checks
+        super().__init__('RS256', **kwargs)
+        self.key_ring = key_ring
+
+    def encode(self, payload):
+        key = self.key_ring.signing_key()
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+        return jwt.encode(
+            jwt_payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={'kid': key.kid},
+            json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+        key = self.key_ring.get(kid)
+        if key is None and verify:
+            raise TokenBackendError(_('Token is invalid or expired'))
+        try:
+            return jwt.decode(
+                token,
+                key.public_key if key else None,
+                algorithms=[key.algorithm] if key else list(ALGORITHMS),
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={
+                    'verify_aud': self.audience is not None,
+                    'verify_signature': verify,
+                },
+            )
+        except InvalidAlgorithmError as ex:
+            raise TokenBackendError(_('Invalid algorithm specified')) from ex
+        except InvalidTokenError as ex:
+            raise TokenBackendError(_('Token is invalid or expired')) from ex
+
+
+key_ring = None
+if getattr(settings, 'JWT_KEYS_DIR', None):
+    key_ring = KeyRing(
+        settings.JWT_KEYS_DIR,
+        reload_interval=getattr(settings, 'JWT_KEYS_RELOAD_INTERVAL', 30),
+        activation_delay=getattr(settings, 'JWT_KEY_ACTIVATION_DELAY', 0),
+    )
+    token_backend = KeyRingTokenBackend(
+        key_ring,
+        audience=api_settings.AUDIENCE,
+        issuer=api_settings.ISSUER,
+        leeway=api_settings.LEEWAY,
+        json_encoder=api_settings.JSON_ENCODER,
+    )
+else:
+    from rest_framework_simplejwt.state import token_backend  # noqa: F401
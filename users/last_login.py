@@ -0,0 +1,213 @@
+"""
+Buffered ``User.last_login`` tracking.
+
+Logins record ``user_id -> timestamp`` in a buffer instead of updating the
+user row straight away. The buffer is flushed with one ``bulk_update`` per
+batch whenever ``LAST_LOGIN_FLUSH_INTERVAL`` seconds have passed, on worker
+exit, or via ``manage.py flush_last_login``.
+"""
+
+import atexit
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone as django_timezone
+
+from .redis_client import guarded_call, redis_client
+from .user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    """Base class: subclasses implement ``_add`` and ``_drain``."""
+
+    def __init__(self, flush_interval, batch_size):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+
+    def record(self, user_id, when):
+        self._add(user_id, when)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except Exception:
+                # Never fail a login because of a bookkeeping write
+                logger.exception('Could not flush last_login buffer')
+
+    def flush(self):
+        """Write all buffered timestamps to the database; return the row count."""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # another thread is already flushing
+        try:
+            self._last_flush = time.monotonic()
+            pending = self._drain()
+            if pending:
+                write_last_logins(pending, self.batch_size)
+            self._written()
+            return len(pending)
+        finally:
+            self._flush_lock.release()
+
+    def _add(self, user_id, when):
+        raise NotImplementedError
+
+    def _drain(self):
+        raise NotImplementedError
+
+    def _written(self):
+        """Called once the drained entries are in the database."""
+
+
+class MemoryLastLoginBuffer(LastLoginBuffer):
+    """Per-worker buffer; pending entries are lost if the worker is killed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _add(self, user_id, when):
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or when > current:
+                self._pending[user_id] = when
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+class RedisLastLoginBuffer(LastLoginBuffer):
+    """
+    Buffer shared by all workers, stored as a Redis hash of epoch seconds.
+
+    A flush renames the hash to a key of its own and deletes that key only
+    once the timestamps are in the database. The key name carries the time
+    of the claim: keys older than ``claim_timeout`` seconds were left behind
+    by a worker that died mid-flush, and any process picks them up (on its
+    first flush, then at most once per ``claim_timeout``). Younger keys may
+    still be being written by a live worker and are left alone.
+    """
+
+    key = 'last_login:pending'
+    claim_timeout = 600
+
+    def __init__(self, client, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+        self._claimed = []
+        self._read = []
+        self._next_recovery = 0.0
+
+    def _add(self, user_id, when):
+        guarded_call(self.client.hset, self.key, user_id, when.timestamp())
+
+    def _flushing_key(self):
+        return f'{self.key}:flushing:{int(time.time())}:{uuid.uuid4().hex}'
+
+    def _abandoned(self, key):
+        claimed_at = key[len(f'{self.key}:flushing:'):].split(':', 1)[0]
+        try:
+            return time.time() - int(claimed_at) >= self.claim_timeout
+        except ValueError:
+            return True  # no claim time in the name: not ours to wait for
+
+    def _claim(self, key):
+        # RENAME is atomic, so logins recorded while we read go to a fresh hash
+        # and no other worker drains the same entries
+        flushing_key = self._flushing_key()
+        ok, _ = guarded_call(self.client.rename, key, flushing_key)
+        if ok:
+            self._claimed.append(flushing_key)
+
+    def _leftover_keys(self):
+        return list(self.client.scan_iter(match=f'{self.key}:flushing:*', count=100))
+
+    def _drain(self):
+        # Keys still in self._claimed come from a flush whose write failed
+        if time.monotonic() >= self._next_recovery:
+            ok, leftovers = guarded_call(self._leftover_keys)
+            if ok:
+                self._next_recovery = time.monotonic() + self.claim_timeout
+                for key in leftovers:
+                    key = key.decode() if isinstance(key, bytes) else key
+                    if key not in self._claimed and self._abandoned(key):
+                        self._claim(key)
+        ok, exists = guarded_call(self.client.exists, self.key)
+        if ok and exists:
+            self._claim(self.key)
+
+        pending = {}
+        self._read = []
+        for key in self._claimed:
+            ok, raw = guarded_call(self.client.hgetall, key)
+            if not ok:
+                continue
+            self._read.append(key)
+            for user_id, ts in raw.items():
+                when = datetime.fromtimestamp(float(ts), tz=timezone.utc)
+                user_id = int(user_id)
+                if user_id not in pending or when > pending[user_id]:
+                    pending[user_id] = when
+        return pending
+
+    def _written(self):
+        if self._read:
+            guarded_call(self.client.delete, *self._read)
+            self._claimed = [key for key in self._claimed if key not in self._read]
+            self._read = []
+
+
+def newer_of(when):
+    # A worker flushing an older buffer never moves last_login backwards.
+    # Greatest() is NULL on some backends if an argument is, hence Coalesce.
+    when = Value(when, output_field=DateTimeField())
+    return Greatest(Coalesce(F('last_login'), when), when)
+
+
+def write_last_logins(pending, batch_size):
+    """
+    Apply ``{user_id: timestamp}`` with batched ``bulk_update`` calls,
+    keeping any newer ``last_login`` already stored.
+    """
+    User = get_user_model()
+    users = [User(pk=user_id, last_login=newer_of(when)) for user_id, when in pending.items()]
+    User.objects.bulk_update(users, ['last_login'], batch_size=batch_size)
+    # bulk_update sends no post_save, so drop the cached copies explicitly
+    user_cache.invalidate_many(pending)
+
+
+def _build_buffer():
+    flush_interval = getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 30)
+    batch_size = getattr(settings, 'LAST_LOGIN_FLUSH_BATCH_SIZE', 500)
+    if getattr(settings, 'LAST_LOGIN_BUFFER', 'memory') == 'redis' and redis_client:
+        return RedisLastLoginBuffer(redis_client, flush_interval, batch_size)
+    return MemoryLastLoginBuffer(flush_interval, batch_size)
+
+
+def _flush_at_exit():
+    try:
+        last_login_buffer.flush()
+    except Exception as e:
+        logger.warning('Could not flush last_login buffer on exit: %s', e)
+
+
+last_login_buffer = _build_buffer()
+atexit.register(_flush_at_exit)
+
+
+def record_login(user):
+    """Stamp ``user.last_login`` in memory and buffer the database write."""
+    user.last_login = django_timezone.now()
+    last_login_buffer.record(user.pk, user.last_login)
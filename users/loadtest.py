@@ -0,0 +1,245 @@
+"""
+Load test of the auth endpoints (``manage.py loadtest``).
+
+Every virtual user runs one scenario: register, log in, refresh the access
+token, read the profile, log out, then request and confirm a password reset.
+Virtual users are spread over ``concurrency`` threads and each request is
+timed per endpoint. The report gives the run's throughput (requests and
+scenarios per second) and p50/p95/p99 latency per endpoint; the endpoints
+share the run, so a per-endpoint rate would only restate how often each
+appears in the scenario.
+
+Requests go either through an in-process ``django.test.Client`` or over
+HTTP (keep-alive, one connection per thread) to a running server. Reports
+are plain dicts so they can be saved as a baseline and compared against
+later runs with ``compare()``.
+"""
+
+import http.client
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.db import connections
+
+ENDPOINTS = (
+    'register',
+    'login',
+    'refresh',
+    'profile',
+    'logout',
+    'password_reset',
+    'password_reset_confirm',
+)
+
+PASSWORD = 'Loadtest-pass-123'
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class InProcessTransport:
+    """
+    Send requests through ``django.test.Client``, one client per thread,
+    with ``host`` (which must be in ``ALLOWED_HOSTS``) as the Host header.
+    """
+
+    def __init__(self, host='localhost'):
+        self.host = host
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        from django.test import Client
+
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {'HTTP_HOST': self.host}
+        if token:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        response = client.generic(
+            method, path, json.dumps(body) if body is not None else '',
+            content_type='application/json', **headers
+        )
+        return response.status_code, response.content
+
+    def close(self):
+        # Each worker thread has its own database connections
+        connections.close_all()
+
+
+class HTTPTransport:
+    """Send requests to a running server over one keep-alive connection per thread."""
+
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(
+                self.netloc, timeout=self.timeout
+            )
+        return connection
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body) if body is not None else None
+        connection = self._connection()
+        try:
+            connection.request(method, self.prefix + path, payload, headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class LoadTest:
+    def __init__(self, transport, users, concurrency, api_prefix='/api/v1/'):
+        self.transport = transport
+        self.users = users
+        self.concurrency = concurrency
+        self.api_prefix = api_prefix
+        self.run_id = uuid.uuid4().hex[:8]
+        self.timings = {name: [] for name in ENDPOINTS}
+        self.errors = Counter()
+        # Scenarios cut short by anything but a failed request
+        self.aborted = 0
+        self._lock = threading.Lock()
+
+    def call(self, name, method, path, body=None, token=None, expect=200):
+        start = time.perf_counter()
+        try:
+            # In-process, exceptions raised by the view end up here too
+            status, content = self.transport.request(method, self.api_prefix + path, body, token)
+        except Exception as e:
+            self.errors[name] += 1
+            raise ScenarioError(f'{name}: {e!r}') from e
+        self.timings[name].append(time.perf_counter() - start)
+        if status != expect:
+            self.errors[name] += 1
+            raise ScenarioError(f'{name}: HTTP {status}')
+        try:
+            return json.loads(content) if content else {}
+        except ValueError as e:
+            self.errors[name] += 1
+            raise ScenarioError(f'{name}: invalid JSON') from e
+
+    def scenario(self, number):
+        email = f'loadtest-{self.run_id}-{number}@example.com'
+        self.call('register', 'POST', 'register/', {
+            'email': email,
+            'full_name': f'Load Test {number}',
+            'password': PASSWORD,
+            'password_confirm': PASSWORD,
+        }, expect=201)
+        tokens = self.call('login', 'POST', 'login/', {'email': email, 'password': PASSWORD})['tokens']
+        access = self.call('refresh', 'POST', 'token/refresh/', {'refresh': tokens['refresh']})['access']
+        self.call('profile', 'GET', 'profile/', token=access)
+        self.call('logout', 'POST', 'logout/', {'refresh': tokens['refresh']}, token=access)
+        reset_token = self.call('password_reset', 'POST', 'password/reset/', {'email': email})['reset_token']
+        self.call('password_reset_confirm', 'POST', 'password/reset/confirm/', {
+            'token': reset_token,
+            'new_password': PASSWORD + '-new',
+            'new_password_confirm': PASSWORD + '-new',
+        })
+
+    def worker(self, numbers):
+        try:
+            for number in numbers:
+                try:
+                    self.scenario(number)
+                except ScenarioError:
+                    pass
+                except Exception:
+                    # e.g. a response without the expected fields; keep the
+                    # run (and its report) going
+                    with self._lock:
+                        self.aborted += 1
+        finally:
+            self.transport.close()
+
+    def run(self):
+        shares = [range(i, self.users, self.concurrency) for i in range(self.concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix='loadtest') as executor:
+            list(executor.map(self.worker, shares))
+        return self.report(time.perf_counter() - start)
+
+    def report(self, duration):
+        endpoints = {}
+        for name in ENDPOINTS:
+            timings = sorted(self.timings[name])
+            endpoints[name] = {
+                'requests': len(timings),
+                'errors': self.errors[name],
+                **{
+                    f'p{pct}': round(percentile(timings, pct) * 1000, 2)
+                    for pct in (50, 95, 99)
+                },
+            }
+        requests = sum(stats['requests'] for stats in endpoints.values())
+        return {
+            'users': self.users,
+            'concurrency': self.concurrency,
+            'duration': round(duration, 3),
+            'rps': round(requests / duration, 2) if duration else 0.0,
+            'aborted': self.aborted,
+            'scenarios_per_sec': round(self.users / duration, 2) if duration else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Regressions of ``report`` against ``baseline``: more errors or aborted
+    scenarios, p95/p99 latency above the baseline by more than ``tolerance``
+    (a fraction), or overall requests/sec below it by more than
+    ``tolerance``.
+    """
+    regressions = []
+    if report.get('aborted', 0) > baseline.get('aborted', 0):
+        regressions.append(f"{report['aborted']} aborted scenarios (baseline {baseline.get('aborted', 0)})")
+    if report['rps'] < baseline['rps'] * (1 - tolerance):
+        regressions.append(f"{report['rps']:.1f} req/s (baseline {baseline['rps']:.1f} req/s)")
+    for name, base in baseline['endpoints'].items():
+        current = report['endpoints'].get(name)
+        if current is None:
+            regressions.append(f'{name}: not measured')
+            continue
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: {current['errors']} errors (baseline {base['errors']})")
+        for key in ('p95', 'p99'):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {current[key]:.2f} ms (baseline {base[key]:.2f} ms)')
+    return regressions
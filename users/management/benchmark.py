@@ -0,0 +1,16 @@
+"""Timing helper shared by the ``benchmark_*`` management commands."""
+
+import time
+
+
+def measure(operation, duration):
+    """Call ``operation()`` repeatedly for ``duration`` seconds; return calls per second."""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        operation()
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - start)
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate requests that each run one query and count the database '
+        'connections opened with CONN_MAX_AGE=0 versus the configured settings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Simulated requests per configuration (default: 500)')
+
+    def handle(self, *args, **options):
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        self.stdout.write(f"{'CONN_MAX_AGE':<14} {'connections':>12} {'ms/request':>11}")
+        for max_age in (0, configured):
+            opened, seconds = self.run(max_age, options['requests'])
+            self.stdout.write(
+                f'{str(max_age):<14} {opened:>12} {seconds / options["requests"] * 1000:>11.3f}'
+            )
+
+    def run(self, max_age, requests):
+        opened = 0
+
+        def count(**kwargs):
+            nonlocal opened
+            opened += 1
+
+        connection.close()
+        original = connection.settings_dict['CONN_MAX_AGE']
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection_created.connect(count)
+        try:
+            start = time.perf_counter()
+            for _ in range(requests):
+                # The connection handling Django's request handler performs
+                request_started.send(sender=self.__class__)
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                request_finished.send(sender=self.__class__)
+            return opened, time.perf_counter() - start
+        finally:
+            connection_created.disconnect(count)
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from users.management.benchmark import measure
+
+PARAMETERS = ('iterations', 'time_cost', 'memory_cost', 'parallelism', 'work_factor', 'block_size')
+
+
+class Command(BaseCommand):
+    help = 'Measure password hashes per second on one core for each configured hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'hashers', nargs='*',
+            help=f"Hashers to measure (default: all of {', '.join(settings.PASSWORD_HASHER_CLASSES)})",
+        )
+        parser.add_argument(
+            '--duration', type=float, default=3.0,
+            help='Seconds to spend on each hasher (default: 3)',
+        )
+
+    def handle(self, *args, **options):
+        names = options['hashers'] or list(settings.PASSWORD_HASHER_CLASSES)
+        unknown = set(names) - set(settings.PASSWORD_HASHER_CLASSES)
+        if unknown:
+            raise CommandError(f"Unknown hasher(s): {', '.join(sorted(unknown))}")
+
+        self.stdout.write(f"{'hasher':<8} {'hashes/s/core':>14} {'ms/hash':>9}  parameters")
+        for name in names:
+            hasher = import_string(settings.PASSWORD_HASHER_CLASSES[name])()
+            try:
+                salt = hasher.salt()
+                rate = measure(lambda: hasher.encode('benchmark-password', salt), options['duration'])
+            except (ImportError, ValueError) as e:
+                self.stderr.write(f'{name:<8} skipped: {e}')
+                continue
+            params = ', '.join(
+                f'{param}={getattr(hasher, param)}' for param in PARAMETERS if hasattr(hasher, param)
+            )
+            self.stdout.write(f'{name:<8} {rate:>14.1f} {1000 / rate:>9.2f}  {params}')
@@ -0,0 +1,56 @@
+import jwt
+from django.core.management.base import BaseCommand, CommandError
+
+from users.keys import generate_private_key
+from users.management.benchmark import measure
+
+ALGORITHMS = ('HS256', 'RS256', 'EdDSA')
+
+PAYLOAD = {
+    'token_type': 'access',
+    'exp': 4102444800,
+    'iat': 1700000000,
+    'jti': '0123456789abcdef0123456789abcdef',
+    'user_id': 12345,
+    'email': 'benchmark@example.com',
+    'full_name': 'Benchmark User',
+    'is_active': True,
+    'is_staff': False,
+    'token_version': 0,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure JWT sign and verify operations per second on one core per algorithm'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'algorithms', nargs='*',
+            help=f"Algorithms to measure (default: {', '.join(ALGORITHMS)})",
+        )
+        parser.add_argument(
+            '--duration', type=float, default=2.0,
+            help='Seconds to spend on each operation (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        algorithms = options['algorithms'] or ALGORITHMS
+        unknown = set(algorithms) - set(ALGORITHMS)
+        if unknown:
+            raise CommandError(f"Unknown algorithm(s): {', '.join(sorted(unknown))}")
+
+        duration = options['duration']
+        self.stdout.write(f"{'algorithm':<10} {'sign/s':>10} {'verify/s':>10} {'bytes':>6}")
+        for algorithm in algorithms:
+            if algorithm == 'HS256':
+                signing_key = verifying_key = 'benchmark-secret-key-with-enough-entropy'
+            else:
+                signing_key = generate_private_key(algorithm)
+                verifying_key = signing_key.public_key()
+
+            token = jwt.encode(PAYLOAD, signing_key, algorithm=algorithm)
+            sign = measure(lambda: jwt.encode(PAYLOAD, signing_key, algorithm=algorithm), duration)
+            verify = measure(
+                lambda: jwt.decode(token, verifying_key, algorithms=[algorithm]), duration
+            )
+            self.stdout.write(f'{algorithm:<10} {sign:>10.0f} {verify:>10.0f} {len(token):>6}')
@@ -0,0 +1,37 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+PATHS = ('/ping/', '/api/v1/profile/')
+
+
+class Command(BaseCommand):
+    help = "Measure per-request time of the 'full' and 'lean' middleware profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help=f"Paths to request (default: {', '.join(PATHS)})")
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per path and profile (default: 2000)')
+
+    def handle(self, *args, **options):
+        # Keep 4xx request logging out of the timings
+        logging.disable(logging.WARNING)
+        self.stdout.write(f"{'path':<20} {'full us/req':>12} {'lean us/req':>12} {'saved':>8}")
+        for path in options['paths'] or PATHS:
+            full, lean = (
+                self.measure(settings.MIDDLEWARE_PROFILES[profile], path, options['requests'])
+                for profile in ('full', 'lean')
+            )
+            self.stdout.write(f'{path:<20} {full:>12.1f} {lean:>12.1f} {full - lean:>8.1f}')
+
+    def measure(self, middleware, path, requests):
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=['*']):
+            client = Client()
+            client.get(path)  # builds the middleware chain
+            start = time.perf_counter()
+            for _ in range(requests):
+                client.get(path)
+            return (time.perf_counter() - start) / requests * 1e6
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.management.benchmark import measure
+from users.responses import profile_data
+from users.serializers import UserProfileSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare UserProfileSerializer with the users.responses fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=2.0,
+                            help='Seconds to spend on each implementation (default: 2)')
+
+    def handle(self, *args, **options):
+        user = User(
+            id=1, email='benchmark@example.com', full_name='Benchmark User',
+            date_joined=timezone.now(), last_login=timezone.now(),
+        )
+        implementations = {
+            'UserProfileSerializer': lambda: UserProfileSerializer(user).data,
+            'profile_data': lambda: profile_data(user),
+        }
+        self.stdout.write(f"{'implementation':<24} {'ops/s':>10} {'us/op':>8}")
+        rates = {}
+        for name, serialize in implementations.items():
+            rates[name] = measure(serialize, options['duration'])
+            self.stdout.write(f'{name:<24} {rates[name]:>10.0f} {1e6 / rates[name]:>8.2f}')
+        speedup = rates['profile_data'] / rates['UserProfileSerializer']
+        self.stdout.write(f'Speedup: {speedup:.1f}x')
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.management.benchmark import measure
+from users.token_factory import token_factory
+from users.tokens import UserRefreshToken
+
+User = get_user_model()
+
+
+def issue_with_token_classes(user):
+    # Leave the OutstandingToken insert out of the timings (build() skips it)
+    refresh = UserRefreshToken.for_user(user, outstanding=False)
+    return str(refresh.access_token), str(refresh)
+
+
+class Command(BaseCommand):
+    help = 'Measure token pairs issued per second on one core, before and after the token factory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=2.0,
+                            help='Seconds to spend on each implementation (default: 2)')
+
+    def handle(self, *args, **options):
+        user = User(
+            id=1, email='benchmark@example.com', full_name='Benchmark User',
+            date_joined=timezone.now(), token_version=0,
+        )
+        implementations = {
+            'UserRefreshToken': lambda: issue_with_token_classes(user),
+            'token_factory': lambda: token_factory.build(user),
+        }
+        self.stdout.write(f"{'implementation':<18} {'pairs/s/core':>13} {'us/pair':>8}")
+        rates = {}
+        for name, issue in implementations.items():
+            rates[name] = measure(issue, options['duration'])
+            self.stdout.write(f'{name:<18} {rates[name]:>13.0f} {1e6 / rates[name]:>8.1f}')
+        self.stdout.write(f"Speedup: {rates['token_factory'] / rates['UserRefreshToken']:.1f}x")
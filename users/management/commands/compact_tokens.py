@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.token_compaction import compact_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.TOKEN_COMPACTION_CHUNK_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks')
+
+    def handle(self, *args, **options):
+        def progress(deleted, seconds):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{deleted} deleted ({deleted / max(seconds, 1e-6):.0f} rows/sec)')
+
+        deleted, seconds = compact_expired_tokens(
+            options['chunk_size'], options['pause'], on_chunk=progress
+        )
+        rate = deleted / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired token(s) in {seconds:.2f}s ({rate:.0f} rows/sec)'
+        ))
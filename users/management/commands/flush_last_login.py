@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.last_login import last_login_buffer
+
+
+class Command(BaseCommand):
+    help = 'Write buffered last_login timestamps to the database'
+
+    def handle(self, *args, **options):
+        count = last_login_buffer.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed last_login for {count} user(s)'))
@@ -0,0 +1,34 @@
+import os
+import secrets
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.keys import ALGORITHMS, generate_private_key, private_key_pem
+
+
+class Command(BaseCommand):
+    help = 'Add a new signing key to JWT_KEYS_DIR (picked up without a restart)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', choices=list(ALGORITHMS), default='EdDSA')
+        parser.add_argument('--kid', help='Key ID (default: random)')
+
+    def handle(self, *args, **options):
+        if not settings.JWT_KEYS_DIR:
+            raise CommandError('JWT_KEYS_DIR is not configured')
+        kid = options['kid'] or secrets.token_hex(8)
+        path = os.path.join(settings.JWT_KEYS_DIR, f'{kid}.pem')
+        if os.path.exists(path):
+            raise CommandError(f'Key {kid} already exists')
+
+        os.makedirs(settings.JWT_KEYS_DIR, exist_ok=True)
+        pem = private_key_pem(generate_private_key(options['algorithm']))
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["algorithm"]} key {kid}; it signs tokens after '
+            f'{settings.JWT_KEY_ACTIVATION_DELAY}s'
+        ))
@@ -0,0 +1,18 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from auth_service.schema import FORMATS, artifact_path, generate_schema
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema to SCHEMA_ARTIFACT_DIR (run after collectstatic)'
+
+    def handle(self, *args, **options):
+        os.makedirs(settings.SCHEMA_ARTIFACT_DIR, exist_ok=True)
+        for fmt in FORMATS:
+            body = generate_schema(fmt)
+            with open(artifact_path(fmt), 'wb') as f:
+                f.write(body)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {artifact_path(fmt)} ({len(body)} bytes)'))
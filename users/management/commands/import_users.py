@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.bulk import FORMATS, import_users, read_rows
+from users.hashing import init_worker
+
+
+class Command(BaseCommand):
+    help = 'Create users from a CSV or JSON Lines file (email, full_name, password)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per bulk INSERT (default: 1000)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used for password hashing (default: all cores)')
+        parser.add_argument('--errors', help='Write rejected rows to this JSON Lines file')
+        parser.add_argument('--checkpoint',
+                            help='Progress file used by --resume (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip rows already committed by a previous run')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+
+        skip_until = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                skip_until = int(f.read().strip() or 0)
+            self.stdout.write(f'Resuming after row {skip_until}')
+
+        errors_file = open(options['errors'], 'a') if options['errors'] else None
+        start = time.perf_counter()
+
+        def on_error(row, errors):
+            if errors_file:
+                errors_file.write(json.dumps({'row': row, 'errors': errors}) + '\n')
+
+        def on_batch(result):
+            with open(checkpoint, 'w') as f:
+                f.write(str(result.last_row))
+            if errors_file:
+                errors_file.flush()
+            rate = result.created / (time.perf_counter() - start)
+            self.stdout.write(
+                f'row {result.last_row}: {result.created} created, '
+                f'{result.failed} failed ({rate:.0f} users/s)'
+            )
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as stream, \
+                    ProcessPoolExecutor(options['workers'], initializer=init_worker) as pool:
+                result = import_users(
+                    read_rows(stream, fmt),
+                    batch_size=options['batch_size'],
+                    hash_map=lambda fn, items: pool.map(fn, items, chunksize=32),
+                    skip_until=skip_until,
+                    on_error=on_error,
+                    on_batch=on_batch,
+                    max_errors=0,
+                )
+        except OSError as e:
+            raise CommandError(e)
+        except UnicodeDecodeError as e:
+            # Batches before the undecodable line are already committed
+            raise CommandError(
+                f'{path} is not UTF-8 encoded ({e}); after fixing it, rerun with '
+                f'--resume to skip the rows recorded in {checkpoint}'
+            )
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} user(s), {result.failed} row(s) rejected'
+        ))
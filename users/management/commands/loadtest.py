@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import tempfile
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from users import loadtest, redis_client
+from users.last_login import last_login_buffer
+from users.replicas import replica_pool
+from users.throttling import rates_lifted
+from users.user_cache import user_cache
+
+
+def request_host():
+    """A Host header that ``ALLOWED_HOSTS`` accepts."""
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    # Any host with '*'; with no ALLOWED_HOSTS, localhost passes when DEBUG is on
+    return 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive register/login/refresh/profile/logout/password reset at a given '
+        'concurrency and report requests/sec and p50/p95/p99 latency per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (default: in-process against '
+                                          'a throwaway test database)')
+        parser.add_argument('--users', type=int, default=50,
+                            help='Virtual users, each running the whole scenario once (default: 50)')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Concurrent virtual users (default: 4)')
+        parser.add_argument('--fakeredis', action='store_true',
+                            help='In-process only: use an in-memory fakeredis server instead of REDIS_URL')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as JSON')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Fail if the results regressed against the baseline at PATH')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed slowdown as a fraction of the baseline (default: 0.2)')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--users and --concurrency must be at least 1')
+        if options['fakeredis'] and options['url']:
+            raise CommandError('--fakeredis only applies to in-process runs')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        # Keep 4xx request logging out of the output
+        logging.disable(logging.WARNING)
+        try:
+            if options['url']:
+                transport = loadtest.HTTPTransport(options['url'])
+                report = loadtest.LoadTest(transport, options['users'], options['concurrency']).run()
+            else:
+                report = self.run_in_process(options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.print_report(report)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+        if baseline is not None:
+            regressions = loadtest.compare(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressed against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def run_in_process(self, options):
+        with ExitStack() as stack:
+            if options['fakeredis']:
+                self.use_fakeredis(stack)
+            # Throttling would reject most of a single client's requests
+            stack.enter_context(rates_lifted())
+            # The throwaway database only exists on the default alias, so
+            # reads must not be routed to the replicas
+            stack.enter_context(replica_pool.bypassed())
+            self.create_database(stack)
+            transport = loadtest.InProcessTransport(request_host())
+            return loadtest.LoadTest(transport, options['users'], options['concurrency']).run()
+
+    def use_fakeredis(self, stack):
+        try:
+            import fakeredis
+            import fakeredis.aioredis
+        except ImportError:
+            raise CommandError('--fakeredis needs the fakeredis package')
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeRedis(server=server)
+        stack.enter_context(redis_client.using(client, fakeredis.aioredis.FakeRedis(server=server)))
+        stack.enter_context(user_cache.using(client))
+
+    def create_database(self, stack):
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # A file, unlike the shared in-memory database, lets concurrent
+            # writers wait for each other's locks
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            test_settings['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+            stack.callback(test_settings.pop, 'NAME')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        stack.callback(connection.creation.destroy_test_db, old_name, verbosity=0)
+        # Buffered last_login writes belong to the test database
+        stack.callback(last_login_buffer.flush)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['users']} users, concurrency {report['concurrency']}, {report['duration']:.1f}s: "
+            f"{report['rps']:.1f} req/s, {report['scenarios_per_sec']:.1f} scenarios/s"
+        )
+        if report['aborted']:
+            self.stdout.write(self.style.WARNING(f"{report['aborted']} scenario(s) aborted by unexpected errors"))
+        self.stdout.write(
+            f"{'endpoint':<24} {'requests':>9} {'errors':>7} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for name, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{name:<24} {stats['requests']:>9} {stats['errors']:>7} "
+                f"{stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}"
+            )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from users import redis_client
+from users.blacklist import blacklist_key, remaining_lifetime
+
+
+class Command(BaseCommand):
+    help = 'Copy unexpired SQL blacklist entries to the Redis token blacklist'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Entries per Redis pipeline (default: 1000)')
+
+    def handle(self, *args, **options):
+        client = redis_client.redis_client
+        if client is None:
+            raise CommandError('REDIS_URL is not configured')
+
+        entries = (
+            BlacklistedToken.objects
+            .filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', 'token__expires_at')
+            .order_by()
+            .iterator(chunk_size=options['batch_size'])
+        )
+        migrated = 0
+        pipe = client.pipeline(transaction=False)
+        for jti, expires_at in entries:
+            ttl = remaining_lifetime(expires_at.timestamp())
+            if ttl <= 0:
+                continue
+            pipe.setex(blacklist_key(jti), ttl, '1')
+            migrated += 1
+            if migrated % options['batch_size'] == 0:
+                pipe.execute()
+        pipe.execute()
+
+        self.stdout.write(self.style.SUCCESS(f'Migrated {migrated} blacklisted token(s) to Redis'))
@@ -0,0 +1,203 @@
+"""
+Prometheus metrics, served at ``/metrics``.
+
+``MetricsMiddleware`` counts requests and times them per endpoint (URL
+name) and method. ``timed(stage)`` and ``instrument(stage)`` time the work
+done inside a request: ``authenticate``, ``password_hash``, ``jwt_encode``,
+``redis`` (commands run through ``guarded_call`` and the async helpers of
+users.redis_client; the blocking reads of the pub/sub listener threads and
+management commands are left out) and ``db`` (every SQL query, through an
+execute wrapper added to each database connection).
+
+``/metrics`` needs ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+token set it is only served with DEBUG on.
+
+Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to a directory: each
+worker then writes its samples to memory-mapped files there, ``/metrics``
+aggregates them, and gunicorn.conf.py empties it on start and removes the
+files of exited workers. Without prometheus_client or with ``METRICS=False``
+everything here is a no-op.
+"""
+
+import contextlib
+import functools
+import hmac
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_safe
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+enabled = prometheus_client is not None and getattr(settings, 'METRICS', True)
+
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+if enabled:
+    REQUESTS = prometheus_client.Counter(
+        'http_requests', 'HTTP requests', ['endpoint', 'method', 'status']
+    )
+    REQUEST_DURATION = prometheus_client.Histogram(
+        'http_request_duration_seconds', 'HTTP request latency', ['endpoint', 'method']
+    )
+    STAGE_DURATION = prometheus_client.Histogram(
+        'auth_stage_duration_seconds', 'Time spent per stage of a request', ['stage'],
+        buckets=STAGE_BUCKETS,
+    )
+
+# Labelled children, looked up once per label set
+_stages = {}
+_requests = {}
+_durations = {}
+
+_disabled = contextlib.nullcontext()
+
+
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def stage_histogram(stage):
+    histogram = _stages.get(stage)
+    if histogram is None:
+        histogram = _stages[stage] = STAGE_DURATION.labels(stage)
+    return histogram
+
+
+def timed(stage):
+    """Context manager timing a block as ``stage``."""
+    if not enabled:
+        return _disabled
+    return Timer(stage_histogram(stage))
+
+
+def instrument(stage):
+    """Decorator timing every call of a (sync) function as ``stage``."""
+    def decorator(func):
+        if not enabled:
+            return func
+        histogram = stage_histogram(stage)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return wrapper
+    return decorator
+
+
+def _time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _stages['db'].observe(time.perf_counter() - start)
+
+
+def _add_query_timer(sender, connection, **kwargs):
+    # The wrapper list belongs to the (per-thread) connection object, which
+    # survives reconnects. It goes first: connection.execute_wrapper() pops
+    # the last entry when its block ends, and the connection may be opened
+    # inside such a block.
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _time_query)
+
+
+if enabled:
+    stage_histogram('db')
+    connection_created.connect(_add_query_timer)
+
+
+def observe_request(request, status_code, duration):
+    match = request.resolver_match
+    endpoint = match.view_name if match is not None else 'unmatched'
+    method = request.method if request.method in METHODS else 'other'
+    key = (endpoint, method)
+    histogram = _durations.get(key)
+    if histogram is None:
+        histogram = _durations[key] = REQUEST_DURATION.labels(endpoint, method)
+    histogram.observe(duration)
+    key = (endpoint, method, status_code)
+    counter = _requests.get(key)
+    if counter is None:
+        counter = _requests[key] = REQUESTS.labels(endpoint, method, str(status_code))
+    counter.inc()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        observe_request(request, response.status_code, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        observe_request(request, response.status_code, time.perf_counter() - start)
+        return response
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return settings.DEBUG
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@require_safe
+def metrics_view(request):
+    if not enabled:
+        raise Http404('Metrics are disabled')
+    if not authorized(request):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(
+        prometheus_client.generate_latest(registry()),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
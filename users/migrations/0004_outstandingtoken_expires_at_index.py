@@ -0,0 +1,44 @@
+from django.db import migrations
+
+from users.db import drop_invalid_index
+
+TABLE = 'token_blacklist_outstandingtoken'
+INDEX = 'token_blacklist_outstandingtoken_expires_at_id'
+
+
+def create_index(apps, schema_editor):
+    # Build without blocking writes on Postgres; the table can be very large
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    drop_invalid_index(schema_editor, INDEX)
+    schema_editor.execute(
+        f'CREATE INDEX {concurrently}IF NOT EXISTS {INDEX} ON {TABLE} (expires_at, id)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+    """
+    Index used by ``manage.py compact_tokens`` (users.token_compaction).
+
+    The table belongs to rest_framework_simplejwt's token_blacklist app, so
+    the index is created with raw SQL and is not part of any model state:
+    token_blacklist's migrations don't know about it. The dependency below
+    makes sure the table and its ``expires_at`` column exist first. This
+    migration owns the index: reversing it drops the index, and if a future
+    token_blacklist migration rebuilds the table, the index has to be created
+    again by a new migration here.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_user_last_login'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
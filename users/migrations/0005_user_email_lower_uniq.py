@@ -0,0 +1,67 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+from users.db import disable_statement_timeout, drop_invalid_index
+
+TABLE = 'users_user'
+INDEX = 'users_user_email_lower_uniq'
+
+
+def create_index(apps, schema_editor):
+    # The duplicate scan and the index build may both take longer than
+    # DATABASE_STATEMENT_TIMEOUT
+    disable_statement_timeout(schema_editor.connection)
+
+    User = apps.get_model('users', 'User')
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias)
+        .values(email_lower=Lower('email'))
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('email_lower', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Emails registered more than once with different casing; merge or '
+            'rename these accounts before migrating: %s' % ', '.join(duplicates)
+        )
+
+    # Build without blocking writes on Postgres; the table can be very large
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    drop_invalid_index(schema_editor, INDEX)
+    schema_editor.execute(
+        f'CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS {INDEX} ON {TABLE} (LOWER(email))'
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+    """Case-insensitive email uniqueness, used by ``UserManager.filter_by_email``."""
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0004_outstandingtoken_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_index, drop_index),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='user',
+                    constraint=models.UniqueConstraint(
+                        Lower('email'),
+                        name=INDEX,
+                        violation_error_message='user with this email address already exists.',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:38
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_email_lower_uniq'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='first_name',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='last_name',
+        ),
+    ]
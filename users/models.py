@@ -1,15 +1,43 @@
-from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
+from . import hashing
+
+# Columns loaded for the user of an authenticated request: what the API
+# (profile, token claims, permission flags) reads. The password hash is
+# only loaded where it is checked or set.
+REQUEST_USER_FIELDS = (
+    'id', 'email', 'full_name', 'is_active', 'is_staff', 'is_superuser',
+    'date_joined', 'last_login', 'token_version',
+)
+
 
 class UserManager(BaseUserManager):
+    # Emails keep the casing they were registered with but are unique and
+    # looked up case-insensitively, through the LOWER(email) unique index.
+
+    def filter_by_email(self, email):
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email.lower())
+
+    def filter_by_emails(self, emails):
+        return self.alias(email_lower=Lower('email')).filter(
+            email_lower__in=[email.lower() for email in emails]
+        )
+
+    def get_by_natural_key(self, username):
+        return self.filter_by_email(username).get()
+
+    def for_request(self):
+        return self.only(*REQUEST_USER_FIELDS)
+
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
-        user.set_password(password)
+        hashing.set_password(user, password)
         user.save(using=self._db)
         return user
 
@@ -25,23 +53,75 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractUser):
-    username = None  # Disable username field
+class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(_('email address'), unique=True)
     full_name = models.CharField(_('full name'), max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
-    last_login = models.DateTimeField(auto_now=True)
+    # Written in batches by users.last_login, never by ordinary saves
+    last_login = models.DateTimeField(_('last login'), blank=True, null=True)
+    # Bumped to invalidate every token issued so far (see users.authentication)
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
+    EMAIL_FIELD = 'email'
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['full_name']
 
     def __str__(self):
         return self.email
 
+    def clean(self):
+        super().clean()
+        self.email = self.__class__.objects.normalize_email(self.email)
+
+    def get_full_name(self):
+        return self.full_name
+
+    def get_short_name(self):
+        return self.full_name
+
+    # Only staff and active superusers use model permissions (in the admin).
+    # For everyone else the checks answer without querying groups and
+    # permissions.
+
+    def _uses_model_permissions(self):
+        return self.is_staff or (self.is_active and self.is_superuser)
+
+    def has_perm(self, perm, obj=None):
+        if not self._uses_model_permissions():
+            return False
+        return super().has_perm(perm, obj)
+
+    def has_module_perms(self, app_label):
+        if not self._uses_model_permissions():
+            return False
+        return super().has_module_perms(app_label)
+
+    def get_user_permissions(self, obj=None):
+        if not self._uses_model_permissions():
+            return set()
+        return super().get_user_permissions(obj)
+
+    def get_group_permissions(self, obj=None):
+        if not self._uses_model_permissions():
+            return set()
+        return super().get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        if not self._uses_model_permissions():
+            return set()
+        return super().get_all_permissions(obj)
+
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        constraints = [
+            models.UniqueConstraint(
+                Lower('email'),
+                name='users_user_email_lower_uniq',
+                violation_error_message=_('user with this email address already exists.'),
+            ),
+        ]
@@ -0,0 +1,262 @@
+"""
+Shared Redis access for the users app.
+
+Both clients draw from a ``BlockingConnectionPool`` with bounded size,
+connect/read timeouts, periodic health checks and retries with exponential
+backoff, all configured through the ``REDIS_*`` settings. A circuit breaker
+stops calling Redis after repeated failures; every Redis command of the
+users app goes through ``guarded_call`` (or ``_call``) so that it is skipped
+while the circuit is open, and the ``*_with_fallback`` helpers use the
+``'fallback'`` cache instead. That cache must not be stored in Redis too,
+or the fallback fails along with it.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from redis.asyncio.retry import Retry as AsyncRetry
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+fallback_cache = ConnectionProxy(caches, 'fallback')
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After ``failure_threshold`` consecutive
+    failures the circuit opens and calls are skipped for ``reset_timeout``
+    seconds, after which a single trial call decides whether it closes again.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through; keep the others out until it reports
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+            if self.opened_at is None:
+                self.trips += 1
+                logger.warning('Redis circuit opened after %d failures', self.failures)
+            self.opened_at = time.monotonic()
+
+
+def _pool_kwargs():
+    return {
+        'max_connections': settings.REDIS_MAX_CONNECTIONS,
+        'timeout': settings.REDIS_POOL_TIMEOUT,
+        'socket_connect_timeout': settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+        'health_check_interval': settings.REDIS_HEALTH_CHECK_INTERVAL,
+        'retry_on_timeout': True,
+    }
+
+
+def _backoff():
+    return ExponentialBackoff(cap=0.5, base=0.01)
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.REDIS_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.REDIS_CIRCUIT_RESET_TIMEOUT,
+)
+
+# Initialize the Redis connections shared by the users app
+redis_client = None
+async_redis_client = None
+if settings.REDIS_URL:
+    try:
+        pool = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            retry=Retry(_backoff(), settings.REDIS_RETRY_ATTEMPTS),
+            **_pool_kwargs(),
+        )
+        redis_client = redis.Redis(connection_pool=pool)
+        async_pool = redis.asyncio.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            retry=AsyncRetry(_backoff(), settings.REDIS_RETRY_ATTEMPTS),
+            **_pool_kwargs(),
+        )
+        async_redis_client = redis.asyncio.Redis(connection_pool=async_pool)
+    except Exception as e:
+        logger.warning('Redis client setup failed, using Django cache fallback: %s', e)
+        redis_client = async_redis_client = None
+else:
+    logger.info('No REDIS_URL configured, using Django cache fallback')
+
+
+@contextmanager
+def using(client, async_client):
+    """
+    Send the users app's Redis commands to ``client`` and ``async_client``
+    instead of ``REDIS_URL`` while the block runs (``manage.py loadtest
+    --fakeredis``). Objects that keep their own client, such as
+    ``users.user_cache``, are switched separately.
+    """
+    global redis_client, async_redis_client
+    saved = redis_client, async_redis_client
+    redis_client, async_redis_client = client, async_client
+    try:
+        yield
+    finally:
+        redis_client, async_redis_client = saved
+
+
+def guarded_call(func, *args):
+    """
+    Run ``func`` (a client method or anything else sending one command)
+    behind the breaker; ``(ok, result)``. Error replies such as WRONGTYPE
+    mean Redis is up, so they don't count towards opening the circuit.
+    """
+    if not breaker.allow():
+        return False, None
+    try:
+        with timed('redis'):
+            result = func(*args)
+    except redis.ResponseError as e:
+        breaker.record_success()
+        logger.warning('Redis %s failed: %s', getattr(func, '__name__', 'command').upper(), e)
+        return False, None
+    except redis.RedisError as e:
+        breaker.record_failure()
+        logger.warning('Redis %s failed: %s', getattr(func, '__name__', 'command').upper(), e)
+        return False, None
+    breaker.record_success()
+    return True, result
+
+
+def _call(method, *args):
+    """Run a method of the shared client behind the breaker; ``(ok, result)``."""
+    if redis_client is None:
+        return False, None
+    return guarded_call(getattr(redis_client, method), *args)
+
+
+async def _acall(method, *args):
+    if async_redis_client is None or not breaker.allow():
+        return False, None
+    try:
+        with timed('redis'):
+            result = await getattr(async_redis_client, method)(*args)
+    except redis.ResponseError as e:
+        breaker.record_success()
+        logger.warning('Redis %s failed: %s', method.upper(), e)
+        return False, None
+    except redis.RedisError as e:
+        breaker.record_failure()
+        logger.warning('Redis %s failed: %s', method.upper(), e)
+        return False, None
+    breaker.record_success()
+    return True, result
+
+
+def setex_with_fallback(key, seconds, value):
+    ok, _ = _call('setex', key, seconds, value)
+    if not ok:
+        fallback_cache.set(key, value, timeout=seconds)
+
+
+def tombstone_key(key):
+    return f'{key}:deleted'
+
+
+def get_with_fallback(key):
+    # Values written to the cache during an outage stay readable afterwards
+    _, value = _call('get', key)
+    if value is None:
+        return fallback_cache.get(key)
+    # A delete that missed Redis left a tombstone
+    return None if fallback_cache.get(tombstone_key(key)) is not None else value
+
+
+def delete_with_fallback(key, seconds):
+    """
+    Delete ``key`` from Redis and the fallback cache. If Redis can't be reached, a
+    tombstone kept for ``seconds`` (the value's remaining lifetime at most)
+    hides the copy left in Redis once it is back.
+    """
+    ok, _ = _call('delete', key)
+    fallback_cache.delete(key)
+    if not ok and redis_client is not None:
+        fallback_cache.set(tombstone_key(key), 1, timeout=seconds)
+
+
+async def asetex_with_fallback(key, seconds, value):
+    ok, _ = await _acall('setex', key, seconds, value)
+    if not ok:
+        await fallback_cache.aset(key, value, timeout=seconds)
+
+
+async def aget_with_fallback(key):
+    _, value = await _acall('get', key)
+    if value is None:
+        return await fallback_cache.aget(key)
+    return None if await fallback_cache.aget(tombstone_key(key)) is not None else value
+
+
+async def adelete_with_fallback(key, seconds):
+    ok, _ = await _acall('delete', key)
+    await fallback_cache.adelete(key)
+    if not ok and async_redis_client is not None:
+        await fallback_cache.aset(tombstone_key(key), 1, timeout=seconds)
+
+
+def pool_stats():
+    """Connection pool usage and circuit breaker state for this worker."""
+    stats = {
+        'configured': redis_client is not None,
+        'circuit_state': breaker.state,
+        'circuit_trips': breaker.trips,
+        'consecutive_failures': breaker.failures,
+    }
+    if redis_client is not None:
+        pool = redis_client.connection_pool
+        created = len(pool._connections)
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        stats.update({
+            'max_connections': pool.max_connections,
+            'created_connections': created,
+            'in_use_connections': created - idle,
+            'idle_connections': idle,
+        })
+    return stats
@@ -0,0 +1,32 @@
+"""
+orjson-backed JSON renderer and parser for DRF.
+
+Selected through ``JSON_BACKEND`` (the default when orjson is installed).
+Output matches ``rest_framework.renderers.JSONRenderer`` apart from
+whitespace and escaping: values orjson can't encode natively (lazy
+translation strings, ``Decimal``, ...) go through DRF's ``JSONEncoder``.
+"""
+
+import orjson
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+_default = encoders.JSONEncoder().default
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONParser(parsers.JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
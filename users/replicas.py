@@ -0,0 +1,193 @@
+"""
+Read replica routing (``DATABASE_REPLICA_URLS``).
+
+``ReplicaRouter`` sends reads of the models in ``REPLICA_MODELS`` (the user
+row, read by login, token authentication and the profile) to a healthy
+replica whose replication lag is below ``REPLICA_MAX_LAG`` seconds, and
+everything else to ``default``. Security state such as the token blacklist
+is always read from the primary, so a lagging replica can never accept a
+revoked token. Each replica is checked at most every
+``REPLICA_CHECK_INTERVAL`` seconds, by one thread while the others keep the
+last result; one that fails or lags is skipped until a later check passes,
+and with no usable replica reads go to the primary.
+
+Reads stay on the primary (read-your-writes):
+
+* for the rest of a request once it has written anything, and
+* for ``REPLICA_PIN_SECONDS`` after a user is saved (profile update,
+  registration, password reset): ``pin_user`` stores a short pin for the
+  user's id and email in the cache, and requests that look a user up by id
+  (token authentication) or email (login) call ``read_as`` first, which
+  checks for a pin. Pins need a shared cache (Redis) to work across workers.
+"""
+
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+
+# ``app_label.model_name`` of the models whose reads may go to a replica
+REPLICA_MODELS = frozenset({'users.user'})
+
+_use_primary = contextvars.ContextVar('use_primary', default=False)
+
+# Seconds behind the primary; 0 when the replica has replayed everything
+POSTGRES_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def pin_key(kind, value):
+    return f'replica_pin:{kind}:{value}'
+
+
+class ReplicaPool:
+    def __init__(self, aliases, max_lag, check_interval):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.state = {alias: {'healthy': True, 'lag': 0.0, 'checked_at': None} for alias in self.aliases}
+        self.fallbacks = 0
+        self.primary_only = False
+        self._cycle = itertools.cycle(self.aliases) if self.aliases else None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def bypassed(self):
+        """
+        Read everything from the primary while the block runs, e.g. when the
+        primary is a throwaway database the replicas don't mirror.
+        """
+        self.primary_only = True
+        try:
+            yield
+        finally:
+            self.primary_only = False
+
+    def measure_lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG_SQL)
+                return float(cursor.fetchone()[0])
+            cursor.execute('SELECT 1')
+            return 0.0
+
+    def check(self, alias):
+        state = self.state[alias]
+        state['checked_at'] = time.monotonic()
+        try:
+            lag = self.measure_lag(alias)
+        except DatabaseError as e:
+            if state['healthy']:
+                logger.warning('Replica %s unavailable, reading from the primary: %s', alias, e)
+            state['healthy'] = False
+            return
+        healthy = lag <= self.max_lag
+        if state['healthy'] and not healthy:
+            logger.warning('Replica %s is %.1fs behind, reading from the primary', alias, lag)
+        state['lag'] = lag
+        state['healthy'] = healthy
+
+    def due(self, state):
+        return state['checked_at'] is None or time.monotonic() - state['checked_at'] >= self.check_interval
+
+    def usable(self, alias):
+        state = self.state[alias]
+        # Only one thread checks; the others go on with the last result
+        # rather than wait for a replica that may not answer
+        if self.due(state) and self._lock.acquire(blocking=False):
+            try:
+                if self.due(state):
+                    self.check(alias)
+            finally:
+                self._lock.release()
+        return state['healthy']
+
+    def choose(self):
+        """The next usable replica (round robin), or ``None``."""
+        if self.primary_only:
+            return None
+        for _ in range(len(self.aliases)):
+            alias = next(self._cycle)
+            if self.usable(alias):
+                return alias
+        if self.aliases:
+            self.fallbacks += 1
+        return None
+
+    def stats(self):
+        return {
+            'replicas': {
+                alias: {'healthy': state['healthy'], 'lag': state['lag']}
+                for alias, state in self.state.items()
+            },
+            'fallbacks': self.fallbacks,
+        }
+
+
+replica_pool = ReplicaPool(
+    [alias for alias in settings.DATABASES if alias != PRIMARY],
+    max_lag=getattr(settings, 'REPLICA_MAX_LAG', 5.0),
+    check_interval=getattr(settings, 'REPLICA_CHECK_INTERVAL', 10),
+)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in REPLICA_MODELS or _use_primary.get():
+            return PRIMARY
+        return replica_pool.choose() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Later reads in this request must see the write
+        _use_primary.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def read_as(user_id=None, email=None):
+    """Keep this request on the primary if the given user was saved recently."""
+    if not replica_pool.aliases or _use_primary.get():
+        return
+    keys = []
+    if user_id is not None:
+        keys.append(pin_key('id', user_id))
+    if email:
+        keys.append(pin_key('email', email.lower()))
+    if keys and cache.get_many(keys):
+        _use_primary.set(True)
+
+
+def pin_user(user):
+    """Route reads for ``user`` to the primary for ``REPLICA_PIN_SECONDS``."""
+    if not replica_pool.aliases:
+        return
+    timeout = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+    cache.set_many({pin_key('id', user.pk): 1, pin_key('email', user.email.lower()): 1}, timeout)
+
+
+def _reset(**kwargs):
+    _use_primary.set(False)
+
+
+request_started.connect(_reset)
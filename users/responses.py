@@ -0,0 +1,73 @@
+"""
+Fast path for the responses built on every login, registration, token
+refresh and profile read.
+
+``UserProfileSerializer(user).data`` runs DRF's field machinery for five
+fixed read-only fields. ``UserProfile`` and ``TokenPair`` are ``__slots__``
+DTOs whose ``as_dict()`` builds the same JSON-ready dicts directly (see
+``manage.py benchmark_serializers``). Writes still go through the DRF
+serializers and their validation.
+"""
+
+from django.utils import timezone
+
+
+def format_datetime(value):
+    """ISO 8601 in the current time zone, as DRF's ``DateTimeField`` renders it."""
+    if not value:
+        return None
+    value = timezone.localtime(value) if timezone.is_aware(value) else timezone.make_aware(value)
+    text = value.isoformat()
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+class UserProfile:
+    """The fields of ``UserProfileSerializer``."""
+
+    __slots__ = ('id', 'email', 'full_name', 'date_joined', 'last_login')
+
+    def __init__(self, id, email, full_name, date_joined, last_login):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+        self.date_joined = date_joined
+        self.last_login = last_login
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.full_name, user.date_joined, user.last_login)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'full_name': self.full_name,
+            'date_joined': format_datetime(self.date_joined),
+            'last_login': format_datetime(self.last_login),
+        }
+
+
+class TokenPair:
+    __slots__ = ('access', 'refresh')
+
+    def __init__(self, access, refresh):
+        self.access = access
+        self.refresh = refresh
+
+    def as_dict(self):
+        return {'access': self.access, 'refresh': self.refresh}
+
+
+def profile_data(user):
+    return UserProfile.from_user(user).as_dict()
+
+
+def auth_data(message, user, tokens):
+    """Body of the login and registration responses; ``tokens`` is a ``TokenPair``."""
+    return {
+        'message': message,
+        'user': profile_data(user),
+        'tokens': tokens.as_dict(),
+    }
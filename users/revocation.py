@@ -0,0 +1,218 @@
+"""
+Immediate revocation of access tokens.
+
+Logout revokes the access token's ``jti``; a password reset sets a per-user
+watermark that revokes every token issued before it. Each worker keeps a
+Bloom filter of revoked ``jti``s and a dict of watermarks, so the check made
+for every authenticated request is O(1) and local. Only a filter hit is
+confirmed with an exact lookup in Redis (or the Django cache).
+
+Revocations are stored in two Redis sorted sets (scored by expiry and
+watermark time) and announced on a pub/sub channel. A daemon thread per
+worker applies the announcements and rebuilds its filter from the sorted
+sets every ``JWT_REVOCATION_RESYNC_INTERVAL`` seconds and after reconnecting,
+which also drops expired entries. Without Redis, revocations only reach the
+worker that made them, so ``JWT_REVOCATION`` is off by default then;
+``token_version`` still covers every mode.
+
+Watermarks are kept as float timestamps while ``iat`` has one-second
+resolution, so tokens issued in the same second as a password reset are
+revoked too: a token from just before the reset is never let through, at the
+cost of a login in that second having to be repeated.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+import redis
+from django.conf import settings
+from rest_framework_simplejwt.settings import api_settings
+
+from . import redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'revocation'
+JTI_SET = 'revocation:jti'
+WATERMARK_SET = 'revocation:watermarks'
+
+
+def jti_key(jti):
+    return f'revoked_jti:{jti}'
+
+
+class BloomFilter:
+    """Bit-array Bloom filter sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationFilter:
+    def __init__(self, enabled, capacity, error_rate, resync_interval):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.resync_interval = resync_interval
+        self.filter = BloomFilter(capacity, error_rate)
+        self.watermarks = {}
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.last_sync = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # Checking
+
+    def is_revoked(self, token):
+        if not self.enabled:
+            return False
+        self._ensure_listener()
+
+        watermark = self.watermarks.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        if watermark is not None and token.get('iat', 0) < watermark:
+            return True
+
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti is None or jti not in self.filter:
+            return False
+        self.filter_hits += 1
+        if redis_client.get_with_fallback(jti_key(jti)) is not None:
+            return True
+        self.false_positives += 1
+        return False
+
+    # Revoking
+
+    def revoke_token(self, token):
+        """Revoke a single (access) token until it expires."""
+        if not self.enabled:
+            return
+        jti, exp = token[api_settings.JTI_CLAIM], token['exp']
+        ttl = int(exp - time.time()) + 1
+        if ttl <= 0:
+            return
+        redis_client.setex_with_fallback(jti_key(jti), ttl, '1')
+        redis_client._call('zadd', JTI_SET, {jti: exp})
+        redis_client._call('publish', CHANNEL, f'jti {jti}')
+        self.filter.add(jti)
+
+    def revoke_user(self, user_id, before=None):
+        """Revoke every token of ``user_id`` issued before ``before`` (default: now)."""
+        if not self.enabled:
+            return
+        before = float(before if before is not None else time.time())
+        redis_client._call('zadd', WATERMARK_SET, {str(user_id): before})
+        redis_client._call('publish', CHANNEL, f'user {user_id} {before}')
+        self._set_watermark(str(user_id), before)
+
+    # Syncing
+
+    def _set_watermark(self, user_id, before):
+        if before > self.watermarks.get(user_id, 0):
+            self.watermarks[user_id] = before
+
+    def apply(self, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        kind, *args = message.split()
+        if kind == 'jti':
+            self.filter.add(args[0])
+        elif kind == 'user':
+            self._set_watermark(args[0], float(args[1]))
+
+    def sync(self, client):
+        """Rebuild the filter and watermarks from Redis, dropping expired entries."""
+        now = time.time()
+        lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        client.zremrangebyscore(JTI_SET, '-inf', now)
+        client.zremrangebyscore(WATERMARK_SET, '-inf', now - lifetime)
+        jtis = client.zrangebyscore(JTI_SET, now, '+inf')
+        marks = client.zrangebyscore(WATERMARK_SET, now - lifetime, '+inf', withscores=True)
+
+        bloom = BloomFilter(max(self.capacity, len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti.decode() if isinstance(jti, bytes) else jti)
+        self.filter = bloom
+        self.watermarks = {
+            (user_id.decode() if isinstance(user_id, bytes) else user_id): float(before)
+            for user_id, before in marks
+        }
+        self.last_sync = now
+
+    def _ensure_listener(self):
+        # Started lazily so that every (forked) worker runs its own listener
+        if self._pid == os.getpid() or redis_client.redis_client is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, name='revocation-listener', daemon=True).start()
+
+    def _listen(self):
+        client = redis_client.redis_client
+        while True:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                self.sync(client)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.apply(message['data'])
+                    if time.time() - self.last_sync >= self.resync_interval:
+                        self.sync(client)
+            except redis.RedisError as e:
+                logger.warning('Revocation listener lost Redis, resyncing shortly: %s', e)
+                time.sleep(1)
+            except Exception:
+                logger.exception('Revocation listener failed')
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'revoked_tokens': self.filter.count,
+            'watermarks': len(self.watermarks),
+            'filter_bits': self.filter.size,
+            'filter_hits': self.filter_hits,
+            'false_positives': self.false_positives,
+            'listening': self._pid == os.getpid(),
+            'last_sync': self.last_sync,
+        }
+
+
+revocation_filter = RevocationFilter(
+    enabled=getattr(settings, 'JWT_REVOCATION', redis_client.redis_client is not None),
+    capacity=getattr(settings, 'JWT_REVOCATION_CAPACITY', 100_000),
+    error_rate=getattr(settings, 'JWT_REVOCATION_ERROR_RATE', 0.001),
+    resync_interval=getattr(settings, 'JWT_REVOCATION_RESYNC_INTERVAL', 300),
+)
+if revocation_filter.enabled and redis_client.redis_client is None:
+    logger.warning(
+        'JWT_REVOCATION is on without Redis: revocations only reach the worker that made them'
+    )
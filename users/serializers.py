@@ -4,7 +4,14 @@ from django.contrib.auth.password_validation import validate_password
 from .models import User
 
 
+def validate_unique_email(value):
+    if User.objects.filter_by_email(value).exists():
+        raise serializers.ValidationError('user with this email address already exists.')
+    return value
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
+    email = serializers.EmailField(max_length=254, validators=[validate_unique_email])
     password = serializers.CharField(write_only=True, validators=[validate_password])
     password_confirm = serializers.CharField(write_only=True)
 
@@ -23,10 +30,33 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserLoginSerializer(serializers.Serializer):
+class BulkUserRegistrationSerializer(UserRegistrationSerializer):
+    """
+    Row validation for bulk imports: no password confirmation, and email
+    uniqueness is checked per batch by users.bulk instead of per row.
+    """
+    email = serializers.EmailField(max_length=254)
+
+    class Meta(UserRegistrationSerializer.Meta):
+        fields = ('email', 'full_name', 'password')
+
+    def validate(self, attrs):
+        return attrs
+
+
+class BulkUserRegistrationRequestSerializer(serializers.Serializer):
+    file = serializers.FileField(help_text="CSV or JSON Lines file with email, full_name and password")
+    format = serializers.ChoiceField(choices=('csv', 'jsonl'), required=False,
+                                     help_text="File format (default: from the file extension)")
+
+
+class LoginCredentialsSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField()
 
+
+class UserLoginSerializer(LoginCredentialsSerializer):
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -78,3 +108,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'email', 'full_name', 'date_joined', 'last_login')
         read_only_fields = ('id', 'email', 'date_joined', 'last_login')
+
+    def update(self, instance, validated_data):
+        # Only write the submitted columns so a cached (possibly stale)
+        # instance never overwrites fields changed elsewhere.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
@@ -0,0 +1,26 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_migrate
+from django.dispatch import receiver
+
+from .db import disable_statement_timeout
+from .models import User
+from .replicas import pin_user
+from .user_cache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def pin_saved_user(sender, instance, **kwargs):
+    # Read the user's own writes from the primary for a while
+    pin_user(instance)
+
+
+@receiver(pre_migrate)
+def lift_statement_timeout(sender, using, **kwargs):
+    # Index builds may take longer than DATABASE_STATEMENT_TIMEOUT
+    disable_statement_timeout(connections[using])
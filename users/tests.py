@@ -1,12 +1,74 @@
-from django.test import TestCase
-from django.urls import reverse
+import atexit
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import jwt
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.urls import include, path, reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
 from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models.signals import pre_migrate
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from auth_service import schema
+from auth_service.middleware import PathScopedMiddleware
+
+from . import (
+    blacklist, db, hashing, loadtest, metrics, redis_client, replicas, signals, throttling, views,
+)
+from .authentication import (
+    CachedJWTAuthentication, ClaimsUser, JWTAuthentication, StatelessJWTAuthentication,
+)
+from .cache_serializers import CompressedPickleSerializer, JSONSerializer
+from .serializers import UserProfileSerializer
+from .keys import KeyRing, KeyRingTokenBackend, generate_private_key, private_key_pem
+from .last_login import (
+    MemoryLastLoginBuffer, RedisLastLoginBuffer, _flush_at_exit, last_login_buffer, write_last_logins,
+)
+from .renderers import ORJSONParser, ORJSONRenderer
+from .responses import profile_data
+from .revocation import BloomFilter, RevocationFilter, revocation_filter
+from .redis_client import fallback_cache
+from .throttling import AnonGCRAThrottle, ScopedGCRAThrottle
+from .token_compaction import compact_expired_tokens
+from .token_factory import SigningContext, TokenFactory, token_factory
+from .tokens import UserAccessToken, UserRefreshToken
+from .user_cache import LRUCache, UserCache, user_cache
+
+try:
+    import fakeredis
+except ImportError:  # optional, only needed for the Redis throttle tests
+    fakeredis = None
 
 User = get_user_model()
 
+# The test database is gone by the time atexit handlers run
+atexit.unregister(_flush_at_exit)
+
 
 class UserModelTest(TestCase):
     def test_create_user(self):
@@ -32,6 +94,31 @@ class UserModelTest(TestCase):
         self.assertTrue(user.is_staff)
         self.assertTrue(user.is_superuser)
 
+    def test_permissions_of_non_staff_users_need_no_queries(self):
+        user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('users.view_user'))
+            self.assertFalse(user.has_module_perms('users'))
+            self.assertEqual(user.get_all_permissions(), set())
+
+    def test_non_staff_superuser_keeps_all_permissions(self):
+        user = User.objects.create_user(
+            email='root@example.com',
+            full_name='Root User',
+            password='testpass123',
+            is_superuser=True,
+        )
+        self.assertTrue(user.has_perm('users.view_user'))
+        self.assertIn('users.view_user', user.get_all_permissions())
+        user.is_active = False
+        with self.assertNumQueries(0):
+            self.assertFalse(user.has_perm('users.view_user'))
+            self.assertEqual(user.get_all_permissions(), set())
+
 
 class UserRegistrationTest(APITestCase):
     def setUp(self):
@@ -63,6 +150,15 @@ class UserRegistrationTest(APITestCase):
         response = self.client.post(self.register_url, invalid_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_user_registration_email_taken_in_other_case(self):
+        self.client.post(self.register_url, self.valid_data)
+        data = dict(self.valid_data, email='Test@Example.com')
+        response = self.client.post(self.register_url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user(email='TEST@example.com', full_name='Copy', password='testpass123')
+
 
 class UserLoginTest(APITestCase):
     def setUp(self):
@@ -83,6 +179,15 @@ class UserLoginTest(APITestCase):
         self.assertIn('tokens', response.data)
         self.assertIn('access', response.data['tokens'])
 
+    def test_user_login_ignores_email_case(self):
+        data = {
+            'email': 'Test@EXAMPLE.com',
+            'password': 'testpass123'
+        }
+        response = self.client.post(self.login_url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['email'], 'test@example.com')
+
     def test_user_login_invalid_credentials(self):
         data = {
             'email': 'test@example.com',
@@ -108,6 +213,10 @@ class PasswordResetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('reset_token', response.data)
 
+    def test_password_reset_request_ignores_email_case(self):
+        response = self.client.post(self.reset_request_url, {'email': 'TEST@example.com'})
+        self.assertIn('reset_token', response.data)
+
     def test_password_reset_confirm_success(self):
         # First request a reset
         data = {'email': 'test@example.com'}
@@ -127,6 +236,16 @@ class PasswordResetTest(APITestCase):
         self.user.refresh_from_db()
         self.assertTrue(self.user.check_password('newpass123'))
 
+    def test_reset_bumps_token_version_atomically(self):
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(token_version=3)
+        user_cache.get(self.user.pk)
+        views.reset_password(stale, make_password('newpass123'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 4)
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(user_cache.get(self.user.pk).token_version, 4)
+
     def test_password_reset_invalid_token(self):
         data = {
             'token': 'invalid-token',
@@ -136,8 +255,37 @@ class PasswordResetTest(APITestCase):
         response = self.client.post(self.reset_confirm_url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+            'OPTIONS': {'socket_connect_timeout': 0.1},
+        },
+        'fallback': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_reset_works_with_redis_and_its_cache_unreachable(self):
+        unreachable = redis_client.redis.Redis(port=1, socket_connect_timeout=0.1)
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        throttles = [AnonGCRAThrottle, ScopedGCRAThrottle]
+        with mock.patch.object(redis_client, 'redis_client', unreachable), \
+                mock.patch.object(redis_client, 'breaker', breaker), \
+                mock.patch.object(views.PasswordResetRequestView, 'throttle_classes', throttles), \
+                mock.patch.object(views.PasswordResetConfirmView, 'throttle_classes', throttles), \
+                self.assertLogs('users', 'WARNING'):
+            response = self.client.post(self.reset_request_url, {'email': 'test@example.com'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post(self.reset_confirm_url, {
+                'token': response.data['reset_token'],
+                'new_password': 'newpass123',
+                'new_password_confirm': 'newpass123',
+            })
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+
     def tearDown(self):
         cache.clear()
+        fallback_cache.clear()
 
 
 class UserProfileTest(APITestCase):
@@ -162,7 +310,1234 @@ class UserProfileTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['full_name'], 'Updated Name')
 
+    def test_profile_request_loads_only_request_fields(self):
+        self.client.force_authenticate(user=None)
+        access = token_factory.issue(self.user).access
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"password"', queries[0]['sql'])
+
     def test_get_profile_unauthenticated(self):
         self.client.force_authenticate(user=None)
         response = self.client.get(self.profile_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class StatelessAuthenticationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+        access = UserRefreshToken.for_user(self.user).access_token
+        self.request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {access}'
+        )
+
+    def test_authenticates_without_query(self):
+        user_cache.clear()
+        # The first request loads the token version into the user cache
+        StatelessJWTAuthentication().authenticate(self.request)
+        with self.assertNumQueries(0):
+            user, _ = StatelessJWTAuthentication().authenticate(self.request)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.email, 'test@example.com')
+        self.assertEqual(user.full_name, 'Test User')
+        self.assertFalse(user.is_staff)
+
+    def test_get_user_loads_database_user(self):
+        user, _ = StatelessJWTAuthentication().authenticate(self.request)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.get_user(), self.user)
+            user.get_user()
+
+    def test_token_version_bump_revokes_token(self):
+        self.user.token_version += 1
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            JWTAuthentication().authenticate(self.request)
+        with self.assertRaises(AuthenticationFailed):
+            StatelessJWTAuthentication().authenticate(self.request)
+
+    def test_refresh_rejects_token_issued_before_reset(self):
+        refresh = str(UserRefreshToken.for_user(self.user))
+        self.user.token_version += 1
+        self.user.save()
+        with self.assertRaises(TokenError):
+            token_factory.refresh(refresh)
+        response = self.client.post(
+            reverse('users:token_refresh'), {'refresh': refresh}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserCacheTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+
+    def test_second_lookup_hits_local_tier(self):
+        before = user_cache.stats()
+        with self.assertNumQueries(1):
+            first = user_cache.get(self.user.pk)
+            second = user_cache.get(self.user.pk)
+        self.assertEqual(first, self.user)
+        self.assertIsNot(first, second)
+        stats = user_cache.stats()
+        self.assertEqual(stats['misses'], before['misses'] + 1)
+        self.assertEqual(stats['local_hits'], before['local_hits'] + 1)
+
+    def test_save_invalidates(self):
+        user_cache.get(self.user.pk)
+        self.user.full_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(user_cache.get(self.user.pk).full_name, 'Renamed')
+
+    def test_lru_evicts_oldest_and_expires(self):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set(1, 'a')
+        lru.set(2, 'b')
+        lru.get(1)
+        lru.set(3, 'c')
+        self.assertIsNone(lru.get(2))
+        self.assertEqual(lru.get(1), 'a')
+        self.assertEqual(lru.evictions, 1)
+        expired = LRUCache(maxsize=2, ttl=-1)
+        expired.set(1, 'a')
+        self.assertIsNone(expired.get(1))
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_invalidation_during_miss_blocks_stale_write_back(self):
+        client = fakeredis.FakeRedis()
+        with mock.patch.object(user_cache, 'client', client):
+            cached, generation = user_cache._get_remote(self.user.pk)
+            self.assertIsNone(cached)
+            # A save lands between the database read and the write-back
+            user_cache.invalidate(self.user.pk)
+            row = user_cache._row(self.user)
+            user_cache._set_remote(self.user.pk, row, generation)
+            self.assertIsNone(client.get(user_cache._key(self.user.pk)))
+
+            cached, generation = user_cache._get_remote(self.user.pk)
+            user_cache._set_remote(self.user.pk, row, generation)
+            self.assertEqual(user_cache._get_remote(self.user.pk)[0], row)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_write_back_script_is_registered_once(self):
+        cache = UserCache(local_size=8, local_ttl=10, redis_ttl=60, key_prefix='test:')
+        row = cache._row(self.user)
+        scripts = set()
+        for client in (fakeredis.FakeRedis(), fakeredis.FakeRedis()):
+            with cache.using(client):
+                cache._set_remote(self.user.pk, row, b'0')
+                cache._set_remote(self.user.pk, row, b'0')
+                self.assertEqual(cache._get_remote(self.user.pk)[0], row)
+            scripts.add(id(cache._script))
+        self.assertEqual(len(scripts), 1)
+
+    def test_cached_user_has_only_request_fields_loaded(self):
+        user_cache.get(self.user.pk)
+        with self.assertNumQueries(0):
+            user = user_cache.get(self.user.pk)
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertEqual(user._state.db, 'default')
+        self.assertFalse(user._state.adding)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('testpass123'))
+
+    def test_invalidation_from_other_worker_drops_local_copy(self):
+        user_cache.get(self.user.pk)
+        user_cache.apply(f'{self.user.pk}'.encode())
+        with self.assertNumQueries(1):
+            user_cache.get(self.user.pk)
+
+
+class LastLoginTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+        last_login_buffer.flush()
+
+    def test_save_does_not_touch_last_login(self):
+        self.user.full_name = 'Renamed'
+        self.user.save()
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+    def test_login_is_buffered_until_flush(self):
+        response = self.client.post(reverse('users:login'), {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['user']['last_login'])
+        last_login_buffer.flush()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_buffer_coalesces_writes(self):
+        from django.utils import timezone
+        buffer = MemoryLastLoginBuffer(flush_interval=3600, batch_size=100)
+        other = User.objects.create_user(
+            email='other@example.com', full_name='Other', password='testpass123'
+        )
+        now = timezone.now()
+        with self.assertNumQueries(0):
+            buffer.record(self.user.pk, now)
+            buffer.record(self.user.pk, now)
+            buffer.record(other.pk, now)
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, now)
+
+    def test_flush_never_moves_last_login_backwards(self):
+        from django.utils import timezone
+        now = timezone.now()
+        other = User.objects.create_user(
+            email='other@example.com', full_name='Other', password='testpass123'
+        )
+        User.objects.filter(pk=self.user.pk).update(last_login=now)
+        write_last_logins({self.user.pk: now - timedelta(minutes=5), other.pk: now}, batch_size=100)
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.user.last_login, now)
+        self.assertEqual(other.last_login, now)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_redis_buffer_recovers_interrupted_flush(self):
+        from django.utils import timezone
+        client = fakeredis.FakeRedis()
+        now = timezone.now()
+        # Left behind by a worker that died between RENAME and the write
+        client.hset(f'{RedisLastLoginBuffer.key}:flushing:dead', self.user.pk, now.timestamp())
+        buffer = RedisLastLoginBuffer(client, flush_interval=3600, batch_size=100)
+        self.assertEqual(buffer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, now)
+        self.assertEqual(client.keys('last_login:*'), [])
+
+        buffer.record(self.user.pk, now)
+        with mock.patch('users.last_login.write_last_logins', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        # The claimed hash is kept until a flush gets it into the database
+        self.assertEqual(len(client.keys('last_login:pending:flushing:*')), 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(client.keys('last_login:*'), [])
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_redis_buffer_leaves_live_claims_alone(self):
+        from django.utils import timezone
+        client = fakeredis.FakeRedis()
+        other = RedisLastLoginBuffer(client, flush_interval=3600, batch_size=100)
+        # Claimed by a live worker that is still writing it
+        live_key = other._flushing_key()
+        client.hset(live_key, self.user.pk, timezone.now().timestamp())
+        buffer = RedisLastLoginBuffer(client, flush_interval=3600, batch_size=100)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(client.keys('last_login:*'), [live_key.encode()])
+
+        with mock.patch('users.last_login.time.time', return_value=time.time() + buffer.claim_timeout):
+            buffer._next_recovery = 0.0
+            self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(client.keys('last_login:*'), [])
+
+
+class PasswordHasherTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+
+    @override_settings(PASSWORD_HASHERS=[
+        'users.hashers.TunedScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ])
+    def test_login_upgrades_stored_hash(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        response = self.client.post(reverse('users:login'), {
+            'email': 'test@example.com',
+            'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$'))
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_hashers', 'scrypt', duration=0.01, stdout=out)
+        self.assertIn('scrypt', out.getvalue())
+
+
+class HashingPoolTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+
+    def test_pool_hashes_and_verifies(self):
+        pool = hashing.HashingExecutor(enabled=True, workers=1, max_pending=2, timeout=30)
+        with mock.patch.object(hashing, 'executor', pool):
+            self.assertTrue(hashing.check_password(self.user, 'testpass123'))
+            self.assertFalse(hashing.check_password(self.user, 'wrongpassword'))
+            encoded = hashing.make_password('otherpass123')
+        self.assertTrue(check_password('otherpass123', encoded))
+        self.assertEqual(pool.stats()['pending'], 0)
+
+    def test_saturated_pool_rejects_login_with_503(self):
+        pool = hashing.HashingExecutor(enabled=True, workers=1, max_pending=0, timeout=30)
+        with mock.patch.object(hashing, 'executor', pool):
+            response = self.client.post(reverse('users:login'), {
+                'email': 'test@example.com',
+                'password': 'testpass123'
+            })
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_map_stays_within_max_pending(self):
+        pool = hashing.HashingExecutor(enabled=True, workers=1, max_pending=4, timeout=30)
+        submit, queued = pool.submit, []
+
+        def record(fn, item):
+            future = submit(fn, item)
+            queued.append(pool.pending)
+            return future
+
+        with mock.patch.object(pool, 'submit', record):
+            self.assertEqual(pool.map(abs, range(-6, 0)), [6, 5, 4, 3, 2, 1])
+        # Half of max_pending at most, the rest is left to requests
+        self.assertEqual(len(queued), 6)
+        self.assertLessEqual(max(queued), 2)
+        self.assertEqual(pool.stats()['pending'], 0)
+        saturated = hashing.HashingExecutor(enabled=True, workers=1, max_pending=0, timeout=30)
+        with self.assertRaises(hashing.HashingPoolSaturated):
+            saturated.map(abs, [-1])
+
+    def test_timeout_and_crashed_pool_become_503(self):
+        pool = hashing.HashingExecutor(enabled=True, workers=1, max_pending=2, timeout=0.05)
+        with self.assertRaises(hashing.HashingPoolSaturated):
+            pool.run(time.sleep, 1)
+        pool.timeout = 30
+        with self.assertRaises(hashing.HashingPoolSaturated):
+            pool.run(os._exit, 1)
+        # The broken pool is replaced on the next submit
+        self.assertEqual(pool.run(abs, -1), 1)
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['restarts'], stats['pending']), (1, 1, 0))
+
+
+# URLconf for AsyncViewsTest: the API served by users.async_views
+urlpatterns = [path('api/v1/', include('users.async_urls'))]
+
+
+@override_settings(ROOT_URLCONF='users.tests')
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        fallback_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+
+    def post(self, name, data, **extra):
+        return self.client.post(
+            reverse(name), data, content_type='application/json', **extra
+        )
+
+    def login(self):
+        response = self.post('users:login', {
+            'email': 'test@example.com', 'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['tokens']
+
+    def test_login_and_profile(self):
+        tokens = self.login()
+        response = self.client.get(
+            reverse('users:profile'), HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['email'], 'test@example.com')
+
+    def test_login_invalid_credentials(self):
+        response = self.post('users:login', {
+            'email': 'test@example.com', 'password': 'wrongpassword'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_profile_requires_token(self):
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_and_logout(self):
+        tokens = self.login()
+        response = self.post('users:token_refresh', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.json())
+        response = self.post(
+            'users:logout', {'refresh': tokens['refresh']},
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.post('users:token_refresh', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_password_reset(self):
+        response = self.post('users:password_reset_request', {'email': 'test@example.com'})
+        reset_token = response.json()['reset_token']
+        response = self.post('users:password_reset_confirm', {
+            'token': reset_token,
+            'new_password': 'newpass123',
+            'new_password_confirm': 'newpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(self.user.token_version, 1)
+
+    # Through the ASGI handler, as served by uvicorn
+
+    async def apost(self, name, data):
+        return await self.async_client.post(reverse(name), data, content_type='application/json')
+
+    async def test_asgi_login_and_profile(self):
+        response = await self.apost('users:login', {
+            'email': 'test@example.com', 'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = response.json()['tokens']['access']
+        response = await self.async_client.get(
+            reverse('users:profile'), AUTHORIZATION=f'Bearer {access}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['email'], 'test@example.com')
+
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'login': '2/minute'})
+    async def test_asgi_login_is_throttled(self):
+        credentials = {'email': 'test@example.com', 'password': 'wrongpassword'}
+        for _ in range(2):
+            response = await self.apost('users:login', credentials)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.apost('users:login', credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    async def test_asgi_inactive_login_looks_like_bad_credentials(self):
+        await User.objects.filter(pk=self.user.pk).aupdate(is_active=False)
+        response = await self.apost('users:login', {
+            'email': 'test@example.com', 'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'non_field_errors': ['Invalid credentials']})
+
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'anon': '2/minute', 'user': '1/minute'})
+    def test_default_throttles_apply_to_every_view(self):
+        tokens = token_factory.issue(self.user)
+        for _ in range(2):
+            self.post('users:token_refresh', {'refresh': 'invalid'})
+        response = self.post('users:token_refresh', {'refresh': tokens.refresh})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # Authenticated views are throttled per user
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {tokens.access}'}
+        self.assertEqual(self.client.get(reverse('users:profile'), **headers).status_code, 200)
+        response = self.client.get(reverse('users:profile'), **headers)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_authentication_follows_jwt_auth_mode(self):
+        user_cache.clear()
+        access = token_factory.issue(self.user).access
+        classes = [CachedJWTAuthentication]
+        with mock.patch.object(drf_settings, 'DEFAULT_AUTHENTICATION_CLASSES', classes):
+            self.client.get(reverse('users:profile'), HTTP_AUTHORIZATION=f'Bearer {access}')
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('users:profile'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.json()['email'], 'test@example.com')
+
+
+class RedisClientTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        fallback_cache.clear()
+        # Nothing listens on port 1, so every call fails fast
+        self.unreachable = redis_client.redis.Redis(connection_pool=redis_client.redis.BlockingConnectionPool(
+            port=1, socket_connect_timeout=0.1
+        ))
+
+    def test_circuit_opens_after_threshold_and_half_opens(self):
+        breaker = redis_client.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+        breaker.opened_at -= 60
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_unreachable_redis_falls_back_to_cache(self):
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with mock.patch.object(redis_client, 'redis_client', self.unreachable), \
+                mock.patch.object(redis_client, 'breaker', breaker):
+            with self.assertLogs('users.redis_client', 'WARNING'):
+                redis_client.setex_with_fallback('reset_key', 60, 'value')
+            self.assertEqual(breaker.state, 'open')
+            self.assertEqual(redis_client.get_with_fallback('reset_key'), 'value')
+            redis_client.delete_with_fallback('reset_key', 60)
+            self.assertIsNone(redis_client.get_with_fallback('reset_key'))
+            self.assertEqual(redis_client.pool_stats()['circuit_trips'], 1)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_delete_missed_by_redis_leaves_tombstone(self):
+        client = fakeredis.FakeRedis()
+        client.setex('reset_key', 60, 'value')
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with mock.patch.object(redis_client, 'redis_client', client), \
+                mock.patch.object(redis_client, 'breaker', breaker):
+            self.assertEqual(redis_client.get_with_fallback('reset_key'), b'value')
+            with mock.patch.object(client, 'delete', side_effect=redis_client.redis.ConnectionError), \
+                    self.assertLogs('users.redis_client', 'WARNING'):
+                redis_client.delete_with_fallback('reset_key', 60)
+            # Redis is back and still has the value
+            breaker.record_success()
+            self.assertEqual(client.get('reset_key'), b'value')
+            self.assertIsNone(redis_client.get_with_fallback('reset_key'))
+
+    def test_open_circuit_skips_user_cache_redis_tier(self):
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        client = mock.Mock()
+        with mock.patch.object(redis_client, 'breaker', breaker), \
+                mock.patch.object(user_cache, 'client', client):
+            self.assertEqual(user_cache._get_remote(1), (None, None))
+            user_cache.invalidate(1)
+        client.mget.assert_not_called()
+        client.pipeline.assert_not_called()
+
+
+class CacheSerializerTest(TestCase):
+    def test_compressed_pickle_round_trip(self):
+        serializer = CompressedPickleSerializer()
+        large = {'history': [1.5] * 1000}
+        data = serializer.dumps(large)
+        self.assertEqual(data[:1], b'\x78')
+        self.assertEqual(serializer.loads(data), large)
+        small = serializer.dumps('token')
+        self.assertEqual(small[:1], b'\x80')
+        self.assertEqual(serializer.loads(small), 'token')
+        self.assertEqual(serializer.dumps(5), 5)
+        self.assertEqual(serializer.loads(b'5'), 5)
+
+    def test_json_round_trip(self):
+        serializer = JSONSerializer()
+        value = {'user_id': 1, 'email': 'test@example.com'}
+        self.assertEqual(serializer.loads(serializer.dumps(value)), value)
+        self.assertEqual(serializer.dumps(7), 7)
+
+
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fallback_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            full_name='Test User',
+            password='testpass123'
+        )
+
+    def tearDown(self):
+        cache.clear()
+        fallback_cache.clear()
+
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'login': '2/minute'})
+    def test_login_scope_limits_and_sets_retry_after(self):
+        data = {'email': 'test@example.com', 'password': 'wrongpassword'}
+        for _ in range(2):
+            response = self.client.post(reverse('users:login'), data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('users:login'), data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def scoped_request(self):
+        view = mock.Mock(throttle_scope='login')
+        request = Request(APIRequestFactory().post('/'))
+        return request, view
+
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'login': '3/minute'})
+    def test_gcra_throttle_falls_back_to_cache_without_redis(self):
+        request, view = self.scoped_request()
+        results = [ScopedGCRAThrottle().allow_request(request, view) for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'login': '1/minute'})
+    def test_rates_lifted(self):
+        request, view = self.scoped_request()
+        with throttling.rates_lifted():
+            self.assertTrue(all(ScopedGCRAThrottle().allow_request(request, view) for _ in range(3)))
+        self.assertEqual(ScopedRateThrottle.THROTTLE_RATES['login'], '1/minute')
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    @mock.patch.dict(ScopedRateThrottle.THROTTLE_RATES, {'login': '3/minute'})
+    def test_gcra_throttle_in_redis(self):
+        request, view = self.scoped_request()
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        with mock.patch.object(redis_client, 'redis_client', fakeredis.FakeRedis()), \
+                mock.patch.object(redis_client, 'breaker', breaker), \
+                mock.patch.object(throttling, '_script', None):
+            throttles = [ScopedGCRAThrottle() for _ in range(4)]
+            results = [throttle.allow_request(request, view) for throttle in throttles]
+            self.assertEqual(results, [True, True, True, False])
+            self.assertAlmostEqual(throttles[-1].wait(), 20, delta=1)
+        # Nothing was written to the cache-based fallback
+        self.assertTrue(ScopedGCRAThrottle().allow_request(request, view))
+
+
+class BulkRegistrationTest(APITestCase):
+    csv_data = (
+        'email,full_name,password\n'
+        'one@example.com,User One,testpass123\n'
+        'not-an-email,User Two,testpass123\n'
+        'existing@example.com,Existing,testpass123\n'
+        'one@example.com,Duplicate,testpass123\n'
+        'three@example.com,User Three,testpass123\n'
+    )
+
+    def setUp(self):
+        User.objects.create_user(
+            email='existing@example.com', full_name='Existing', password='testpass123'
+        )
+        self.admin = User.objects.create_superuser(
+            email='admin@example.com', full_name='Admin', password='adminpass123'
+        )
+        self.url = reverse('users:bulk_register')
+
+    def test_bulk_register_reports_row_errors(self):
+        self.client.force_authenticate(user=self.admin)
+        upload = SimpleUploadedFile('users.csv', self.csv_data.encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(sorted(e['row'] for e in response.data['errors']), [2, 3, 4])
+        user = User.objects.get(email='three@example.com')
+        self.assertTrue(user.check_password('testpass123'))
+
+    @override_settings(BULK_REGISTRATION_MAX_ROWS=2)
+    def test_bulk_register_limit_counts_rows(self):
+        self.client.force_authenticate(user=self.admin)
+        rows = [
+            json.dumps({'email': f'user{i}@example.com', 'full_name': 'User', 'password': 'testpass123'})
+            for i in range(3)
+        ]
+        upload = SimpleUploadedFile('users.jsonl', '\n\n'.join(rows[:2]).encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        upload = SimpleUploadedFile('more.jsonl', '\n'.join(rows).encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_utf8_file_is_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+        upload = SimpleUploadedFile('users.csv', self.csv_data.encode('utf-16'))
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            with open(path, 'wb') as f:
+                f.write(self.csv_data.encode('latin-1') + 'caf\xe9@example.com,Caf\xe9,x\n'.encode('latin-1'))
+            with self.assertRaisesMessage(CommandError, 'not UTF-8 encoded'):
+                call_command('import_users', path, '--workers', '1', stdout=StringIO())
+
+    def test_bulk_register_requires_admin(self):
+        user = User.objects.get(email='existing@example.com')
+        self.client.force_authenticate(user=user)
+        upload = SimpleUploadedFile('users.csv', self.csv_data.encode())
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command_resumes_from_checkpoint(self):
+        rows = [
+            {'email': f'user{i}@example.com', 'full_name': f'User {i}', 'password': 'testpass123'}
+            for i in range(5)
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.jsonl')
+            with open(path, 'w') as f:
+                f.write('\n'.join(json.dumps(row) for row in rows))
+            with open(f'{path}.checkpoint', 'w') as f:
+                f.write('3')
+            errors = os.path.join(tmp, 'errors.jsonl')
+            call_command('import_users', path, '--resume', '--batch-size', '2',
+                         '--workers', '1', '--errors', errors, stdout=StringIO())
+            with open(f'{path}.checkpoint') as f:
+                self.assertEqual(f.read(), '5')
+            with open(errors) as f:
+                self.assertEqual(f.read(), '')
+        imported = User.objects.filter(email__startswith='user').values_list('email', flat=True)
+        self.assertEqual(sorted(imported), ['user3@example.com', 'user4@example.com'])
+
+
+class RedisBlacklistTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fallback_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+
+    @override_settings(JWT_BLACKLIST_BACKEND='redis')
+    def test_blacklist_skips_sql_tables(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        UserRefreshToken(str(refresh)).blacklist()
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+        with self.assertRaises(TokenError):
+            UserRefreshToken(str(refresh))
+
+        response = self.client.post(reverse('users:token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(JWT_BLACKLIST_BACKEND='redis')
+    def test_blacklist_check_fails_closed(self):
+        refresh = str(UserRefreshToken.for_user(self.user))
+        breaker = redis_client.CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        with mock.patch.object(redis_client, 'redis_client', mock.Mock()), \
+                mock.patch.object(redis_client, 'breaker', breaker):
+            response = self.client.post(reverse('users:token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        with mock.patch.object(blacklist, 'fallback_cache', mock.Mock(**{'get.side_effect': ConnectionError})):
+            response = self.client.post(reverse('users:token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_migrate_command_copies_live_entries(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        refresh.blacklist()
+        client = fakeredis.FakeRedis()
+        with mock.patch.object(redis_client, 'redis_client', client):
+            call_command('migrate_blacklist_to_redis', stdout=StringIO())
+            key = blacklist.blacklist_key(refresh['jti'])
+            self.assertGreater(client.ttl(key), 0)
+            with override_settings(JWT_BLACKLIST_BACKEND='redis'):
+                with self.assertRaises(TokenError):
+                    UserRefreshToken(str(refresh))
+
+
+class RevocationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        fallback_cache.clear()
+        for attr, value in [
+            ('enabled', True), ('filter', BloomFilter(1000, 0.001)), ('watermarks', {}),
+        ]:
+            patcher = mock.patch.object(revocation_filter, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+
+    def test_logout_revokes_access_token(self):
+        refresh = UserRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        self.assertEqual(self.client.get(reverse('users:profile')).status_code, status.HTTP_200_OK)
+        self.client.post(reverse('users:logout'), {'refresh': str(refresh)})
+        response = self.client.get(reverse('users:profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_watermark_revokes_older_tokens(self):
+        token = UserRefreshToken.for_user(self.user).access_token
+        auth = StatelessJWTAuthentication()
+        auth.get_validated_token(str(token).encode())
+        revocation_filter.revoke_user(self.user.id, before=token['iat'] + 1)
+        with self.assertRaises(AuthenticationFailed):
+            auth.get_validated_token(str(token).encode())
+
+    def test_watermark_revokes_tokens_issued_in_the_same_second(self):
+        token = UserRefreshToken.for_user(self.user).access_token
+        revocation_filter.revoke_user(self.user.id, before=token['iat'] + 0.5)
+        self.assertTrue(revocation_filter.is_revoked(token))
+        revocation_filter.apply(f"user {self.user.id} {token['iat'] - 0.5}")
+        self.assertEqual(revocation_filter.watermarks[str(self.user.id)], token['iat'] + 0.5)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_workers_sync_from_redis(self):
+        client = fakeredis.FakeRedis()
+        token = UserRefreshToken.for_user(self.user).access_token
+        with mock.patch.object(redis_client, 'redis_client', client), \
+                mock.patch.object(revocation_filter, '_pid', os.getpid()):
+            revocation_filter.revoke_token(token)
+            revocation_filter.revoke_user(self.user.id)
+            worker = RevocationFilter(True, 1000, 0.001, 300)
+            worker._pid = os.getpid()  # no listener thread
+            worker.sync(client)
+            self.assertTrue(worker.is_revoked(token))
+            self.assertIn(str(self.user.id), worker.watermarks)
+
+
+class TokenCompactionTest(TestCase):
+    def test_compact_tokens_deletes_only_expired(self):
+        user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+        expired = UserRefreshToken.for_user(user)
+        expired.blacklist()
+        live = UserRefreshToken.for_user(user)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        for i in range(4):
+            OutstandingToken.objects.create(
+                user=user, jti=f'old-{i}', token='x',
+                expires_at=timezone.now() - timedelta(days=1),
+            )
+
+        out = StringIO()
+        call_command('compact_tokens', '--chunk-size', '2', stdout=out)
+        self.assertIn('Deleted 5 expired token(s)', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_chunks_walk_tokens_sharing_an_expiry(self):
+        user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+        expires_at = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            OutstandingToken.objects.create(user=user, jti=f'old-{i}', token='x', expires_at=expires_at)
+
+        deleted, _ = compact_expired_tokens(chunk_size=2)
+        self.assertEqual(deleted, 5)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+
+class MigrationHelpersTest(TestCase):
+    def test_migrate_lifts_statement_timeout(self):
+        postgres = mock.MagicMock(vendor='postgresql')
+        with mock.patch.object(signals, 'connections', {'default': postgres}):
+            pre_migrate.send(sender=None, app_config=None, using='default')
+        cursor = postgres.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with('SET statement_timeout = 0')
+
+    def test_invalid_index_is_dropped_before_rebuild(self):
+        schema_editor = mock.Mock()
+        schema_editor.connection = mock.MagicMock(vendor='postgresql')
+        cursor = schema_editor.connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = None
+        db.drop_invalid_index(schema_editor, 'some_index')
+        schema_editor.execute.assert_not_called()
+        cursor.fetchone.return_value = (1,)
+        db.drop_invalid_index(schema_editor, 'some_index')
+        schema_editor.execute.assert_called_once_with('DROP INDEX CONCURRENTLY IF EXISTS some_index')
+
+
+class KeyRingTest(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.key_dir = tmp.name
+        self.add_key('first', 'RS256')
+        self.key_ring = KeyRing(self.key_dir, reload_interval=30, activation_delay=0)
+        backend = KeyRingTokenBackend(self.key_ring)
+        for cls in (UserAccessToken, UserRefreshToken):
+            patcher = mock.patch.object(cls, '_token_backend', backend)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+
+    def add_key(self, kid, algorithm):
+        with open(os.path.join(self.key_dir, f'{kid}.pem'), 'wb') as f:
+            f.write(private_key_pem(generate_private_key(algorithm)))
+
+    def test_rotation_keeps_old_tokens_valid(self):
+        old = UserRefreshToken.for_user(self.user).access_token
+        self.assertEqual(jwt.get_unverified_header(str(old))['kid'], 'first')
+
+        self.add_key('second', 'EdDSA')
+        os.utime(os.path.join(self.key_dir, 'first.pem'), (time.time() - 60,) * 2)
+        self.key_ring.refresh(force=True)
+        new = UserRefreshToken.for_user(self.user).access_token
+        header = jwt.get_unverified_header(str(new))
+        self.assertEqual((header['kid'], header['alg']), ('second', 'EdDSA'))
+
+        self.assertEqual(UserAccessToken(str(old))['user_id'], self.user.id)
+        self.assertEqual(UserAccessToken(str(new))['user_id'], self.user.id)
+
+    def test_jwks_etag(self):
+        with mock.patch.object(views, 'key_ring', self.key_ring):
+            response = self.client.get('/.well-known/jwks.json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([key['kid'] for key in response.json()['keys']], ['first'])
+            response = self.client.get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SchemaTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.artifact_dir = tmp.name
+        patcher = mock.patch.object(schema, '_schemas', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_schema_is_generated_once_and_revalidated(self):
+        with override_settings(SCHEMA_ARTIFACT_DIR=self.artifact_dir), \
+                mock.patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('/login/', response.json()['paths'])
+            response = self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(generate.call_count, 1)
+
+    def test_generate_schema_writes_artifacts(self):
+        with override_settings(SCHEMA_ARTIFACT_DIR=self.artifact_dir):
+            call_command('generate_schema', stdout=StringIO())
+            with open(os.path.join(self.artifact_dir, 'swagger.json'), 'rb') as f:
+                artifact = f.read()
+            self.assertEqual(self.client.get('/swagger.json').content, artifact)
+            self.assertTrue(os.path.exists(os.path.join(self.artifact_dir, 'swagger.yaml')))
+
+
+class TeapotOnErrorMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        return HttpResponse(status=418)
+
+
+class PathScopedMiddlewareTest(TestCase):
+    def setUp(self):
+        self.seen = []
+
+        def view(request):
+            self.seen.append(hasattr(request, 'session') or hasattr(request, 'user'))
+            return HttpResponse()
+
+        self.middleware = PathScopedMiddleware(view)
+
+    def test_api_paths_skip_browser_middleware(self):
+        factory = RequestFactory()
+        self.middleware(factory.get('/api/v1/profile/'))
+        self.middleware(factory.get('/admin/'))
+        self.assertEqual(self.seen, [False, True])
+
+    def test_admin_keeps_csrf_protection(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post('/admin/login/', {'username': 'x', 'password': 'y'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_async_mode_keeps_api_paths_async(self):
+        async def view(request):
+            self.seen.append(hasattr(request, 'session') or hasattr(request, 'user'))
+            return HttpResponse()
+
+        middleware = PathScopedMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(iscoroutinefunction(middleware.process_view))
+        factory = RequestFactory()
+        await middleware(factory.get('/api/v1/profile/'))
+        await middleware(factory.get('/admin/'))
+        self.assertEqual(self.seen, [False, True])
+
+    @override_settings(BROWSER_MIDDLEWARE=['users.tests.TeapotOnErrorMiddleware'])
+    def test_forwards_process_exception_outside_api_paths(self):
+        middleware = PathScopedMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+        response = middleware.process_exception(factory.get('/admin/'), ValueError())
+        self.assertEqual(response.status_code, 418)
+        self.assertIsNone(middleware.process_exception(factory.get('/api/v1/'), ValueError()))
+
+
+class JSONBackendTest(APITestCase):
+    def test_orjson_renderer_matches_stdlib(self):
+        data = {
+            'message': _('Login successful'),
+            'errors': {'email': [ErrorDetail('Invalid', code='invalid')]},
+            'id': 1,
+        }
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data))
+        )
+
+    def test_orjson_parser_rejects_invalid_json(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(BytesIO(b'{"a": [1, 2]}')), {'a': [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"a": NaN}'))
+
+    def test_form_bodies_are_rejected(self):
+        response = self.client.post(
+            reverse('users:login'),
+            {'email': 'test@example.com', 'password': 'testpass123'},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class ResponseFastPathTest(TestCase):
+    def test_profile_data_matches_serializer(self):
+        user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+        self.assertEqual(profile_data(user), UserProfileSerializer(user).data)
+        user.last_login = timezone.now().replace(microsecond=0)
+        self.assertEqual(profile_data(user), UserProfileSerializer(user).data)
+        with timezone.override('Africa/Lagos'):
+            self.assertEqual(profile_data(user), UserProfileSerializer(user).data)
+
+
+class TokenFactoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+
+    def test_issued_pair_verifies_with_token_classes(self):
+        tokens = token_factory.issue(self.user)
+        access = UserAccessToken(tokens.access)
+        refresh = UserRefreshToken(tokens.refresh)
+        self.assertEqual(access['user_id'], self.user.id)
+        self.assertEqual(access['email'], refresh['email'])
+        self.assertNotEqual(access['jti'], refresh['jti'])
+        outstanding = OutstandingToken.objects.get(jti=refresh['jti'])
+        self.assertEqual(outstanding.token, tokens.refresh)
+
+    def test_refresh_copies_claims(self):
+        tokens = token_factory.refresh(token_factory.issue(self.user).refresh)
+        access = UserAccessToken(tokens.access)
+        self.assertEqual(access['full_name'], 'Test User')
+        self.assertEqual(access['token_type'], 'access')
+        with self.assertRaises(TokenError):
+            token_factory.refresh(tokens.access)
+
+    def test_signing_context_matches_pyjwt(self):
+        payload = {'user_id': 1, 'token_type': 'access', 'jti': 'abc'}
+        context = SigningContext('HS256', 'secret', kid='first')
+        self.assertEqual(
+            context.sign(payload),
+            jwt.encode(payload, 'secret', algorithm='HS256', headers={'kid': 'first'}),
+        )
+
+    def test_signing_context_follows_key_rotation(self):
+        with tempfile.TemporaryDirectory() as key_dir:
+            with open(os.path.join(key_dir, 'first.pem'), 'wb') as f:
+                f.write(private_key_pem(generate_private_key('EdDSA')))
+            key_ring = KeyRing(key_dir, reload_interval=0, activation_delay=0)
+            factory = TokenFactory(KeyRingTokenBackend(key_ring))
+            tokens, _ = factory.build(self.user)
+            self.assertEqual(jwt.get_unverified_header(tokens.access)['kid'], 'first')
+
+            os.utime(os.path.join(key_dir, 'first.pem'), (time.time() - 60,) * 2)
+            with open(os.path.join(key_dir, 'second.pem'), 'wb') as f:
+                f.write(private_key_pem(generate_private_key('RS256')))
+            tokens, _ = factory.build(self.user)
+            self.assertEqual(jwt.get_unverified_header(tokens.access)['kid'], 'second')
+            self.assertEqual(factory.backend.decode(tokens.access)['user_id'], self.user.id)
+
+
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.pool = replicas.ReplicaPool(['replica1'], max_lag=5.0, check_interval=0)
+        self.lag = mock.patch.object(self.pool, 'measure_lag', return_value=0.5).start()
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(replicas, 'replica_pool', self.pool).start()
+        replicas._reset()
+        self.addCleanup(replicas._reset)
+        self.router = replicas.ReplicaRouter()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.assertFalse(self.router.allow_migrate('replica1', 'users'))
+
+    def test_blacklist_reads_stay_on_primary(self):
+        self.assertEqual(self.router.db_for_read(BlacklistedToken), 'default')
+        self.assertEqual(self.router.db_for_read(OutstandingToken), 'default')
+
+    def test_bypassed_pool_reads_from_primary(self):
+        with self.pool.bypassed():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.assertEqual(self.pool.fallbacks, 0)
+
+    def test_lag_check_in_progress_does_not_block_reads(self):
+        with self.pool._lock:
+            self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.lag.assert_not_called()
+
+    def test_write_keeps_request_on_primary(self):
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        replicas._reset()
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+
+    def test_saved_user_is_read_from_primary(self):
+        user = User.objects.create_user(
+            email='Pinned@example.com', full_name='Pinned User', password='testpass123'
+        )
+        replicas._reset()
+        replicas.read_as(email='other@example.com')
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        replicas.read_as(email='pinned@example.com')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        replicas._reset()
+        replicas.read_as(user_id=user.pk)
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_lagging_or_failing_replica_falls_back(self):
+        self.lag.return_value = 30.0
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.lag.side_effect = DatabaseError('connection refused')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.pool.stats()['fallbacks'], 2)
+        self.lag.side_effect = None
+        self.lag.return_value = 0.0
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+
+
+class LoadTestTest(TestCase):
+    class Transport:
+        responses = {
+            '/api/v1/register/': (201, {}),
+            '/api/v1/login/': (200, {'tokens': {'access': 'a', 'refresh': 'r'}}),
+            '/api/v1/token/refresh/': (200, {'access': 'a2'}),
+            '/api/v1/password/reset/': (200, {'reset_token': 't'}),
+        }
+
+        def __init__(self, fail=()):
+            self.fail = fail
+
+        def request(self, method, path, body=None, token=None):
+            if path in self.fail:
+                return 500, b''
+            status_code, data = self.responses.get(path, (200, {}))
+            return status_code, json.dumps(data).encode()
+
+        def close(self):
+            pass
+
+    def test_report_covers_every_endpoint(self):
+        report = loadtest.LoadTest(self.Transport(), users=6, concurrency=3).run()
+        self.assertEqual(set(report['endpoints']), set(loadtest.ENDPOINTS))
+        for stats in report['endpoints'].values():
+            self.assertEqual(stats['requests'], 6)
+            self.assertEqual(stats['errors'], 0)
+            self.assertLessEqual(stats['p50'], stats['p99'])
+            self.assertNotIn('rps', stats)
+        self.assertGreater(report['rps'], report['scenarios_per_sec'])
+
+    def test_failed_step_ends_scenario(self):
+        transport = self.Transport(fail=('/api/v1/token/refresh/',))
+        report = loadtest.LoadTest(transport, users=2, concurrency=1).run()
+        self.assertEqual(report['endpoints']['refresh']['errors'], 2)
+        self.assertEqual(report['endpoints']['profile']['requests'], 0)
+
+    def test_unexpected_errors_do_not_abort_the_run(self):
+        class Transport(self.Transport):
+            registrations = 0
+
+            def request(self, method, path, body=None, token=None):
+                if path == '/api/v1/register/':
+                    self.registrations += 1
+                    if self.registrations == 1:
+                        raise RuntimeError('view crashed')
+                if path == '/api/v1/login/':
+                    return 200, b'{}'  # no tokens
+                return super().request(method, path, body, token)
+
+        report = loadtest.LoadTest(Transport(), users=3, concurrency=1).run()
+        self.assertEqual(report['endpoints']['register']['errors'], 1)
+        self.assertEqual(report['endpoints']['login']['requests'], 2)
+        self.assertEqual(report['aborted'], 2)
+
+    def test_compare_flags_regressions(self):
+        self.assertEqual(loadtest.percentile([1, 2, 3, 4], 50), 2)
+        base = {'rps': 100.0, 'endpoints': {'login': {'errors': 0, 'p95': 10.0, 'p99': 20.0}}}
+        same = {'rps': 95.0, 'endpoints': {'login': {'errors': 0, 'p95': 11.0, 'p99': 21.0}}}
+        slower = {'rps': 50.0, 'endpoints': {'login': {'errors': 1, 'p95': 15.0, 'p99': 20.0}}}
+        self.assertEqual(loadtest.compare(same, base, tolerance=0.2), [])
+        self.assertEqual(len(loadtest.compare(slower, base, tolerance=0.2)), 3)
+        self.assertEqual(
+            loadtest.compare({'rps': 100.0, 'endpoints': {}}, base, 0.2), ['login: not measured']
+        )
+
+
+@skipUnless(metrics.enabled, 'prometheus_client is not installed')
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsTest(APITestCase):
+    def setUp(self):
+        User.objects.create_user(
+            email='test@example.com', full_name='Test User', password='testpass123'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer scrape-token')
+
+    def test_requires_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        with override_settings(METRICS_TOKEN=''):
+            self.client.credentials()
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_query_timer_survives_scoped_execute_wrappers(self):
+        wrapper = lambda execute, *args: execute(*args)  # noqa: E731
+        with mock.patch.object(connection, 'execute_wrappers', []):
+            with connection.execute_wrapper(wrapper):
+                # A connection opened inside the block adds the timer then
+                metrics._add_query_timer(None, connection)
+            self.assertEqual(connection.execute_wrappers, [metrics._time_query])
+
+    def test_login_is_broken_down_by_stage(self):
+        self.client.post(reverse('users:login'), {'email': 'test@example.com', 'password': 'testpass123'})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertRegex(
+            body, r'http_requests_total\{endpoint="users:login",method="POST",status="200"\} [1-9]'
+        )
+        for stage in ('authenticate', 'password_hash', 'jwt_encode', 'db'):
+            self.assertIn(f'auth_stage_duration_seconds_count{{stage="{stage}"}}', body)
+
+    def test_unmatched_paths_share_one_label(self):
+        self.client.get('/no-such-page/')
+        self.assertIn('endpoint="unmatched"', self.client.get('/metrics').content.decode())
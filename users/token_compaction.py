@@ -0,0 +1,129 @@
+"""
+Purging of expired rows from simplejwt's ``OutstandingToken`` table (and,
+through the foreign key, ``BlacklistedToken``).
+
+Rows are deleted in chunks of ``TOKEN_COMPACTION_CHUNK_SIZE``, each in its
+own short transaction, walking the ``(expires_at, id)`` index with keyset
+pagination so no chunk rescans rows already visited and locks are never held
+for long. ``manage.py compact_tokens`` runs it once; with
+``TOKEN_COMPACTION_INTERVAL`` set, the WSGI/ASGI entry points also start a
+background thread that runs it periodically. When Redis is configured a lock
+ensures only one worker per interval does the work.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from . import redis_client
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'token_compaction:lock'
+
+
+def compact_expired_tokens(chunk_size=1000, pause=0, before=None, on_chunk=None):
+    """
+    Delete tokens that expired before ``before`` (default: now), sleeping
+    ``pause`` seconds between chunks. Returns ``(deleted, seconds)``.
+    """
+    before = before or timezone.now()
+    started = time.monotonic()
+    deleted = 0
+    cursor = None
+    while True:
+        expired = OutstandingToken.objects.filter(expires_at__lt=before)
+        if cursor is not None:
+            last_expiry, last_id = cursor
+            # A row comparison, unlike the equivalent OR of two predicates,
+            # is a single range condition on the (expires_at, id) index
+            expired = expired.filter(RawSQL(
+                '(expires_at, id) > (%s, %s)',
+                (connection.ops.adapt_datetimefield_value(last_expiry), last_id),
+                output_field=BooleanField(),
+            ))
+        chunk = list(
+            expired.order_by('expires_at', 'id').values_list('expires_at', 'id')[:chunk_size]
+        )
+        if not chunk:
+            break
+        ids = [token_id for _, token_id in chunk]
+        with transaction.atomic():
+            # BlacklistedToken rows go with their token (ON DELETE CASCADE)
+            _, per_model = OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += per_model.get(OutstandingToken._meta.label, 0)
+        cursor = chunk[-1]
+        if on_chunk:
+            on_chunk(deleted, time.monotonic() - started)
+        if len(chunk) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted, time.monotonic() - started
+
+
+class CompactionScheduler:
+    def __init__(self, interval, chunk_size):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.runs = 0
+        self.last_deleted = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread for this process (once per process)."""
+        if not self.interval:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name='token-compaction', daemon=True).start()
+
+    def _acquire(self):
+        client = redis_client.redis_client
+        if client is None:
+            return True
+        ok, acquired = redis_client.guarded_call(
+            functools.partial(client.set, nx=True, ex=self.interval), LOCK_KEY, os.getpid()
+        )
+        if not ok:
+            logger.warning('Token compaction lock unavailable, skipping this run')
+            return False
+        return bool(acquired)
+
+    def run_once(self):
+        if not self._acquire():
+            return
+        try:
+            deleted, seconds = compact_expired_tokens(self.chunk_size)
+        finally:
+            close_old_connections()
+        self.runs += 1
+        self.last_deleted = deleted
+        if deleted:
+            logger.info('Compacted %d expired token(s) in %.1fs', deleted, seconds)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Token compaction failed')
+
+
+scheduler = CompactionScheduler(
+    interval=getattr(settings, 'TOKEN_COMPACTION_INTERVAL', 0),
+    chunk_size=getattr(settings, 'TOKEN_COMPACTION_CHUNK_SIZE', 1000),
+)
@@ -0,0 +1,184 @@
+"""
+Single-pass issuance of access/refresh token pairs.
+
+``UserRefreshToken.for_user(user)`` followed by ``str(refresh.access_token)``
+and ``str(refresh)`` builds two ``Token`` objects, resolves the algorithm and
+key through PyJWT for every encode and, in the database blacklist mode,
+encodes the refresh token twice (once for its ``OutstandingToken`` row).
+
+``TokenFactory`` keeps a ``SigningContext`` per process, holding the
+prepared key, the PyJWT algorithm object and the base64url header segment,
+and signs both tokens from payloads that share their common claims. The
+context follows key rotation (see users.keys). The tokens are the same
+JWTs ``UserRefreshToken`` produces and verify with it (see
+``manage.py benchmark_tokens``).
+"""
+
+import base64
+import json
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import get_default_algorithms
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import (
+    aware_utcnow,
+    datetime_from_epoch,
+    datetime_to_epoch,
+    get_md5_hash_password,
+)
+
+from .authentication import check_token_version
+from .keys import token_backend
+from .metrics import instrument
+from .responses import TokenPair
+from .tokens import USER_CLAIMS, UserRefreshToken, uses_redis_blacklist
+from .user_cache import user_cache
+
+
+def b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+class SigningContext:
+    """Everything needed to sign a JWT with one key, prepared once."""
+
+    __slots__ = ('source', 'algorithm', 'key', 'header_segment', 'json_encoder')
+
+    def __init__(self, algorithm, key, kid=None, source=None, json_encoder=None):
+        self.source = source
+        self.algorithm = get_default_algorithms()[algorithm]
+        self.key = self.algorithm.prepare_key(key)
+        header = {'alg': algorithm, 'typ': 'JWT'}
+        if kid is not None:
+            header['kid'] = kid
+        # Sorted, as PyJWT writes headers
+        self.header_segment = b64encode(
+            json.dumps(header, separators=(',', ':'), sort_keys=True).encode()
+        )
+        self.json_encoder = json_encoder
+
+    @instrument('jwt_encode')
+    def sign(self, payload):
+        payload_segment = b64encode(
+            json.dumps(payload, separators=(',', ':'), cls=self.json_encoder).encode()
+        )
+        signing_input = self.header_segment + b'.' + payload_segment
+        signature = self.algorithm.sign(signing_input, self.key)
+        return (signing_input + b'.' + b64encode(signature)).decode()
+
+
+class TokenFactory:
+    def __init__(self, backend):
+        self.backend = backend
+        self.access_lifetime = api_settings.ACCESS_TOKEN_LIFETIME
+        self.refresh_lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+        self._context = None
+
+    def signing_context(self):
+        key_ring = getattr(self.backend, 'key_ring', None)
+        context = self._context
+        if key_ring is None:
+            if context is None:
+                context = self._context = SigningContext(
+                    self.backend.algorithm,
+                    self.backend.signing_key,
+                    json_encoder=self.backend.json_encoder,
+                )
+            return context
+        key = key_ring.signing_key()
+        if context is None or context.source is not key:
+            context = self._context = SigningContext(
+                key.algorithm,
+                key.private_key,
+                kid=key.kid,
+                source=key,
+                json_encoder=self.backend.json_encoder,
+            )
+        return context
+
+    def _payload(self, token_type, now, lifetime, claims):
+        payload = {
+            api_settings.TOKEN_TYPE_CLAIM: token_type,
+            'exp': datetime_to_epoch(now + lifetime),
+            'iat': datetime_to_epoch(now),
+            api_settings.JTI_CLAIM: uuid4().hex,
+        }
+        payload.update(claims)
+        if self.backend.audience is not None:
+            payload['aud'] = self.backend.audience
+        if self.backend.issuer is not None:
+            payload['iss'] = self.backend.issuer
+        return payload
+
+    def user_claims(self, user):
+        user_id = getattr(user, api_settings.USER_ID_FIELD)
+        if not isinstance(user_id, int):
+            user_id = str(user_id)
+        claims = {api_settings.USER_ID_CLAIM: user_id}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            claims[api_settings.REVOKE_TOKEN_CLAIM] = get_md5_hash_password(user.password)
+        for claim in USER_CLAIMS:
+            claims[claim] = getattr(user, claim)
+        return claims
+
+    def build(self, user):
+        """Sign a pair for ``user``; returns ``(TokenPair, refresh_payload)``."""
+        context = self.signing_context()
+        now = aware_utcnow()
+        claims = self.user_claims(user)
+        refresh_payload = self._payload('refresh', now, self.refresh_lifetime, claims)
+        access_payload = self._payload('access', now, self.access_lifetime, claims)
+        return TokenPair(context.sign(access_payload), context.sign(refresh_payload)), refresh_payload
+
+    def issue(self, user):
+        """
+        Issue a token pair for ``user``, recording the refresh token as
+        outstanding unless the Redis blacklist is in use.
+        """
+        tokens, refresh_payload = self.build(user)
+        if not uses_redis_blacklist():
+            OutstandingToken.objects.create(
+                user=user,
+                jti=refresh_payload[api_settings.JTI_CLAIM],
+                token=tokens.refresh,
+                created_at=datetime_from_epoch(refresh_payload['iat']),
+                expires_at=datetime_from_epoch(refresh_payload['exp']),
+            )
+        return tokens
+
+    def refresh(self, raw_refresh_token):
+        """
+        Verify a refresh token (signature, expiry, blacklist, and the user's
+        active flag and token version) and return a new access token with its
+        claims, paired with the refresh token itself. Raises ``TokenError``
+        like ``UserRefreshToken``.
+        """
+        refresh = UserRefreshToken(raw_refresh_token)
+        self.check_user(refresh.payload)
+        claims = {
+            claim: value for claim, value in refresh.payload.items()
+            if claim not in refresh.no_copy_claims and claim not in ('iat', 'aud', 'iss')
+        }
+        access_payload = self._payload('access', refresh.current_time, self.access_lifetime, claims)
+        return TokenPair(self.signing_context().sign(access_payload), raw_refresh_token)
+
+    def check_user(self, payload):
+        """Reject tokens of inactive users and those issued before a password reset."""
+        try:
+            user = user_cache.get(payload[api_settings.USER_ID_CLAIM])
+        except (KeyError, get_user_model().DoesNotExist):
+            raise TokenError(_('User not found'))
+        if not user.is_active:
+            raise TokenError(_('User is inactive'))
+        try:
+            check_token_version(user, payload)
+        except AuthenticationFailed as e:
+            raise TokenError(e.detail) from e
+
+
+token_factory = TokenFactory(token_backend)
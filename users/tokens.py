@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import blacklist
+from .keys import token_backend
+from .metrics import instrument
+
+# User attributes copied into every token so that requests can be
+# authenticated without loading the User row (see users.authentication).
+USER_CLAIMS = ('email', 'full_name', 'is_active', 'is_staff', 'token_version')
+
+
+def uses_redis_blacklist():
+    return getattr(settings, 'JWT_BLACKLIST_BACKEND', 'database') == 'redis'
+
+
+class UserAccessToken(AccessToken):
+    """Access token signed by ``users.keys.token_backend``."""
+
+    _token_backend = token_backend
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token that embeds the user claims listed in ``USER_CLAIMS``.
+    Access tokens derived from it inherit the same claims.
+
+    With ``JWT_BLACKLIST_BACKEND = 'redis'`` the token is blacklisted in
+    Redis (``users.blacklist``) and no ``OutstandingToken`` row is written.
+    """
+
+    access_token_class = UserAccessToken
+    _token_backend = token_backend
+
+    @classmethod
+    @instrument('jwt_encode')
+    def for_user(cls, user, outstanding=True):
+        """
+        Token for ``user``. ``outstanding=False`` skips the
+        ``OutstandingToken`` row of the database blacklist, e.g. to time
+        only the token work (``manage.py benchmark_tokens``).
+        """
+        # Imported here: token_factory builds on this module
+        from .token_factory import token_factory
+
+        if uses_redis_blacklist() or not outstanding:
+            # BlacklistMixin.for_user would insert an OutstandingToken
+            token = cls()
+        else:
+            token = super().for_user(user)
+        token.payload.update(token_factory.user_claims(user))
+        return token
+
+    def check_blacklist(self):
+        if not uses_redis_blacklist():
+            return super().check_blacklist()
+        if blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        if not uses_redis_blacklist():
+            return super().blacklist()
+        blacklist.add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
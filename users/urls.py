@@ -6,6 +6,7 @@ app_name = 'users'
 urlpatterns = [
     # Authentication endpoints
     path('register/', views.UserRegistrationView.as_view(), name='register'),
+    path('register/bulk/', views.BulkUserRegistrationView.as_view(), name='bulk_register'),
     path('login/', views.UserLoginView.as_view(), name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('token/refresh/', views.TokenRefreshView.as_view(), name='token_refresh'),
@@ -0,0 +1,299 @@
+"""
+Two-tier cache for the ``User`` objects resolved during JWT authentication.
+
+A small per-worker LRU (with TTL) sits in front of a shared Redis tier, which
+in turn sits in front of the database. Saves and deletes of a user clear both
+tiers (see ``users.signals``) and are announced on a pub/sub channel, which a
+daemon thread per worker listens on to drop its local copy. Should a message
+be missed, the local copy still expires after ``USER_CACHE_LOCAL_TTL`` seconds.
+
+Each invalidation also bumps a per-user generation in Redis. A miss reads the
+generation together with the cached row and only writes the row it loaded
+from the database back if the generation is unchanged, so a save that lands
+between the database read and the write-back cannot leave a stale row behind.
+
+Both tiers hold the values of ``REQUEST_USER_FIELDS`` rather than model
+instances, and every ``get()`` builds a fresh user from them. Those are the
+only fields loaded: any other (the password hash) is deferred and costs a
+query when accessed, so code that checks or sets the password loads the
+user itself. Adding a field to ``REQUEST_USER_FIELDS`` needs no change here,
+as the cached rows are keyed on the field list (see ``_key``).
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import REQUEST_USER_FIELDS
+from .redis_client import guarded_call, redis_client
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'user_cache:invalidate'
+
+# KEYS: row, generation; ARGV: generation read before the database load, ttl, row
+SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[2])
+return 1
+"""
+
+
+@functools.cache
+def cached_fields():
+    """``REQUEST_USER_FIELDS`` in model order, the order ``Model.from_db()`` expects."""
+    return tuple(
+        field.attname for field in get_user_model()._meta.concrete_fields
+        if field.attname in REQUEST_USER_FIELDS
+    )
+
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserCache:
+    """Resolve users by id through the local LRU, then Redis, then the database."""
+
+    def __init__(self, local_size, local_ttl, redis_ttl, key_prefix, client=None):
+        self.local = LRUCache(local_size, local_ttl)
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.client = client
+        self._counters = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'redis_errors': 0}
+        # Bumped by every invalidation in this worker; guards the local tier
+        # the way the Redis generation guards the shared one
+        self._invalidations = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._script = None
+        # Rows cached for another field list are never read back
+        self._fields_tag = hashlib.sha1(','.join(REQUEST_USER_FIELDS).encode()).hexdigest()[:8]
+
+    @contextmanager
+    def using(self, client):
+        """Use ``client`` for the Redis tier while the block runs."""
+        saved, self.client = self.client, client
+        self.local.clear()
+        try:
+            yield
+        finally:
+            self.client = saved
+            self.local.clear()
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}{self._fields_tag}:{user_id}'
+
+    def _generation_key(self, user_id):
+        return f'{self.key_prefix}gen:{user_id}'
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _row(user):
+        return tuple(getattr(user, name) for name in cached_fields())
+
+    @staticmethod
+    def _build(row):
+        # Writes go to the primary whichever database the row was read from
+        return get_user_model().from_db(DEFAULT_DB_ALIAS, cached_fields(), row)
+
+    def get(self, user_id):
+        """
+        Return a new instance of the user with the given id, with only
+        ``REQUEST_USER_FIELDS`` loaded, or raise ``User.DoesNotExist``.
+        """
+        self._ensure_listener()
+        row = self.local.get(user_id)
+        if row is not None:
+            self._count('local_hits')
+            return self._build(row)
+
+        invalidations = self._invalidations
+        row, generation = self._get_remote(user_id)
+        if row is not None:
+            self._count('redis_hits')
+        else:
+            self._count('misses')
+            User = get_user_model()
+            row = self._row(User.objects.for_request().get(pk=user_id))
+            if generation is not None:
+                self._set_remote(user_id, row, generation)
+
+        if self._invalidations == invalidations:
+            self.local.set(user_id, row)
+        return self._build(row)
+
+    def invalidate(self, user_id):
+        self.invalidate_many([user_id])
+
+    def invalidate_many(self, user_ids):
+        user_ids = list(user_ids)
+        self._invalidations += 1
+        for user_id in user_ids:
+            self.local.delete(user_id)
+        if self.client is None or not user_ids:
+            return
+        ok, _ = guarded_call(self._invalidate_remote, user_ids)
+        if not ok:
+            self._count('redis_errors')
+
+    def clear(self):
+        """Clear the local tier (the Redis tier expires on its own)."""
+        self._invalidations += 1
+        self.local.clear()
+
+    def stats(self):
+        return {
+            **self._counters,
+            'local_size': len(self.local),
+            'local_maxsize': self.local.maxsize,
+            'local_evictions': self.local.evictions,
+            'listening': self._pid == os.getpid(),
+        }
+
+    def _get_remote(self, user_id):
+        """
+        Return the cached row (or None) and the user's generation, which is
+        None when Redis is not available.
+        """
+        if self.client is None:
+            return None, None
+        ok, values = guarded_call(
+            self.client.mget, self._key(user_id), self._generation_key(user_id)
+        )
+        if not ok:
+            self._count('redis_errors')
+            return None, None
+        data, generation = values
+        return (pickle.loads(data) if data else None), (generation or b'0')
+
+    def _set_remote(self, user_id, row, generation):
+        if self.client is None or self.redis_ttl <= 0:
+            return
+        # Registered once; each call runs EVALSHA on whichever client is in use
+        if self._script is None:
+            self._script = self.client.register_script(SET_IF_GENERATION)
+        ok, _ = guarded_call(
+            functools.partial(self._script, client=self.client),
+            [self._key(user_id), self._generation_key(user_id)],
+            [generation, self.redis_ttl, pickle.dumps(row)],
+        )
+        if not ok:
+            self._count('redis_errors')
+
+    def _invalidate_remote(self, user_ids):
+        # The generation outlives any database read a concurrent miss may
+        # still be doing
+        generation_ttl = max(self.redis_ttl, 60)
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.incr(self._generation_key(user_id))
+            pipe.expire(self._generation_key(user_id), generation_ttl)
+        pipe.delete(*[self._key(user_id) for user_id in user_ids])
+        pipe.publish(CHANNEL, ' '.join(str(user_id) for user_id in user_ids))
+        return pipe.execute()
+
+    # Invalidations made by other workers
+
+    def apply(self, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        self._invalidations += 1
+        for user_id in message.split():
+            self.local.delete(int(user_id) if user_id.isdigit() else user_id)
+
+    def _ensure_listener(self):
+        # Started lazily so that every (forked) worker runs its own listener
+        if self._pid == os.getpid() or self.client is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, name='user-cache-listener', daemon=True).start()
+
+    def _listen(self):
+        client = self.client
+        while True:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                # Invalidations may have been missed while disconnected
+                self.clear()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.apply(message['data'])
+            except redis.RedisError as e:
+                logger.warning('User cache listener lost Redis, retrying shortly: %s', e)
+                time.sleep(1)
+            except Exception:
+                logger.exception('User cache listener failed')
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+
+user_cache = UserCache(
+    local_size=getattr(settings, 'USER_CACHE_LOCAL_SIZE', 1024),
+    local_ttl=getattr(settings, 'USER_CACHE_LOCAL_TTL', 10),
+    redis_ttl=getattr(settings, 'USER_CACHE_REDIS_TTL', 300),
+    key_prefix=getattr(settings, 'USER_CACHE_KEY_PREFIX', 'user_cache:'),
+    client=redis_client,
+)
@@ -1,20 +1,36 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.conf import settings
+from django.db.models import F
+from django.http import HttpResponse
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import redis
 import secrets
 import json
-import os
+from itertools import islice
 
+from . import hashing
+from .authentication import get_db_user
+from .bulk import import_users, read_rows
+from .keys import EMPTY_JWKS, key_ring
+from .last_login import record_login
+from .redis_client import delete_with_fallback, get_with_fallback, setex_with_fallback
+from .replicas import pin_user
+from .responses import auth_data, profile_data
+from .revocation import revocation_filter
+from .token_factory import token_factory
+from .tokens import UserRefreshToken
+from .user_cache import user_cache
 from .serializers import (
+    BulkUserRegistrationRequestSerializer,
     UserRegistrationSerializer,
     UserLoginSerializer,
     PasswordResetRequestSerializer,
@@ -26,18 +42,22 @@ from .serializers import (
 
 User = get_user_model()
 
-# Initialize Redis connection for password reset tokens
-redis_client = None
-try:
-    redis_url = os.environ.get('REDIS_URL')
-    if redis_url:
-        redis_client = redis.from_url(redis_url)
-        print("✅ Redis client initialized successfully")
-    else:
-        print("⚠️  No REDIS_URL found, using Django cache fallback")
-except Exception as e:
-    print(f"⚠️  Redis connection failed: {e}")
-    print("🔄 Using Django cache fallback for password reset tokens")
+
+def reset_password(user, password_hash):
+    """
+    Store a new password hash and invalidate every token issued so far.
+
+    token_version is bumped in the same UPDATE, so concurrent resets never
+    write the same version and a stale (e.g. replica) copy of the user
+    can't roll it back.
+    """
+    User.objects.filter(pk=user.pk).update(
+        password=password_hash, token_version=F('token_version') + 1
+    )
+    # update() sends no post_save (see users.signals)
+    user_cache.invalidate(user.pk)
+    pin_user(user)
+    revocation_filter.revoke_user(user.pk)
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -78,15 +98,75 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
-            return Response({
-                'message': 'User registered successfully',
-                'user': UserProfileSerializer(user).data,
-                'tokens': {
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh)
+            tokens = token_factory.issue(user)
+            return Response(
+                auth_data('User registered successfully', user, tokens),
+                status=status.HTTP_201_CREATED
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BulkUserRegistrationView(generics.GenericAPIView):
+    """
+    Create many user accounts from an uploaded CSV or JSON Lines file
+    """
+    serializer_class = BulkUserRegistrationRequestSerializer
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Create many user accounts from a CSV or JSON Lines file with "
+            "email, full_name and password. Larger imports should use "
+            "`manage.py import_users`."
+        ),
+        responses={
+            200: openapi.Response(
+                description="Import finished",
+                examples={
+                    "application/json": {
+                        "created": 2,
+                        "failed": 1,
+                        "last_row": 3,
+                        "errors": [
+                            {"row": 2, "errors": {"email": ["Enter a valid email address."]}}
+                        ]
+                    }
                 }
-            }, status=status.HTTP_201_CREATED)
+            ),
+            400: "Bad request - missing file, not UTF-8 or too many rows",
+            403: "Forbidden - admin users only"
+        }
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            upload = serializer.validated_data['file']
+            fmt = serializer.validated_data.get('format') or (
+                'jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv'
+            )
+
+            # Hashing runs within the request, so only small files are taken
+            max_rows = settings.BULK_REGISTRATION_MAX_ROWS
+            lines = (line.decode('utf-8-sig') for line in upload)
+            try:
+                rows = list(islice(read_rows(lines, fmt), max_rows + 1))
+            except UnicodeDecodeError:
+                return Response({
+                    'error': 'Files must be UTF-8 encoded'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if len(rows) > max_rows:
+                return Response({
+                    'error': f'Files are limited to {max_rows} rows; use manage.py import_users'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            result = import_users(
+                rows,
+                batch_size=settings.BULK_REGISTRATION_BATCH_SIZE,
+                hash_map=hashing.executor.map,
+                max_errors=100,
+            )
+            return Response(result.as_dict(), status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -97,6 +177,7 @@ class UserLoginView(generics.GenericAPIView):
     """
     serializer_class = UserLoginSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
 
     @swagger_auto_schema(
         operation_description="Authenticate and login a user",
@@ -127,15 +208,11 @@ class UserLoginView(generics.GenericAPIView):
         serializer = self.get_serializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
-            return Response({
-                'message': 'Login successful',
-                'user': UserProfileSerializer(user).data,
-                'tokens': {
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh)
-                }
-            }, status=status.HTTP_200_OK)
+            record_login(user)
+            tokens = token_factory.issue(user)
+            return Response(
+                auth_data('Login successful', user, tokens), status=status.HTTP_200_OK
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -146,6 +223,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
     """
     serializer_class = PasswordResetRequestSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
 
     @swagger_auto_schema(
         operation_description="Request a password reset token",
@@ -168,7 +246,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
         if serializer.is_valid():
             email = serializer.validated_data['email']
             try:
-                user = User.objects.get(email=email)
+                user = User.objects.filter_by_email(email).get()
                 # Generate reset token
                 reset_token = secrets.token_urlsafe(32)
                 
@@ -180,10 +258,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
                 }
                 
                 # Use Redis if available, otherwise fallback to Django cache
-                if redis_client:
-                    redis_client.setex(cache_key, 600, json.dumps(cache_data))  # 10 minutes
-                else:
-                    cache.set(cache_key, json.dumps(cache_data), timeout=600)  # 10 minutes
+                setex_with_fallback(cache_key, 600, json.dumps(cache_data))  # 10 minutes
                 
                 # In a real application, you would send this token via email
                 # For demo purposes, we'll return it in the response
@@ -210,6 +285,7 @@ class PasswordResetConfirmView(generics.GenericAPIView):
     """
     serializer_class = PasswordResetConfirmSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
 
     @swagger_auto_schema(
         operation_description="Confirm password reset with token",
@@ -234,10 +310,7 @@ class PasswordResetConfirmView(generics.GenericAPIView):
             # Check if token exists in Redis/cache
             cache_key = f"password_reset_{token}"
             
-            if redis_client:
-                cached_data = redis_client.get(cache_key)
-            else:
-                cached_data = cache.get(cache_key)
+            cached_data = get_with_fallback(cache_key)
             
             if not cached_data:
                 return Response({
@@ -251,15 +324,11 @@ class PasswordResetConfirmView(generics.GenericAPIView):
                 user_data = json.loads(cached_data)
                 user = User.objects.get(id=user_data['user_id'])
                 
-                # Update password
-                user.set_password(new_password)
-                user.save()
+                # Update password and invalidate previously issued tokens
+                reset_password(user, hashing.make_password(new_password))
                 
                 # Remove token from Redis/cache
-                if redis_client:
-                    redis_client.delete(cache_key)
-                else:
-                    cache.delete(cache_key)
+                delete_with_fallback(cache_key, 600)
                 
                 return Response({
                     'message': 'Password reset successful'
@@ -281,7 +350,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_db_user(self.request.user)
 
     @swagger_auto_schema(
         operation_description="Get user profile",
@@ -291,7 +360,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         }
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        return Response(profile_data(self.get_object()))
 
     @swagger_auto_schema(
         operation_description="Update user profile",
@@ -333,12 +402,12 @@ class TokenRefreshView(generics.GenericAPIView):
         if serializer.is_valid():
             try:
                 refresh_token = serializer.validated_data['refresh']
-                refresh = RefreshToken(refresh_token)
-                return Response({
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh)
-                }, status=status.HTTP_200_OK)
-                
+                tokens = token_factory.refresh(refresh_token)
+                return Response(tokens.as_dict(), status=status.HTTP_200_OK)
+
+            except APIException:
+                # e.g. the blacklist could not be checked (503)
+                raise
             except Exception as e:
                 return Response({
                     'error': 'Invalid refresh token'
@@ -374,10 +443,14 @@ def logout_view(request):
         try:
             refresh_token = serializer.validated_data.get('refresh')
             
+            # Reject the access token used for this request from now on
+            if request.auth is not None:
+                revocation_filter.revoke_token(request.auth)
+            
             # Blacklist the refresh token if provided
             if refresh_token:
                 try:
-                    token = RefreshToken(refresh_token)
+                    token = UserRefreshToken(refresh_token)
                     token.blacklist()
                 except Exception as e:
                     # If refresh token is invalid, that's okay for logout
@@ -398,4 +471,23 @@ def logout_view(request):
         return Response({
             'message': 'Logout successful',
             'note': 'Logout completed despite invalid data'
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+
+def _jwks_etag(request):
+    if key_ring is None:
+        return None
+    key_ring.refresh()
+    return key_ring.etag
+
+
+@require_GET
+@cache_control(public=True, max_age=settings.JWKS_MAX_AGE)
+@condition(etag_func=_jwks_etag)
+def jwks_view(request):
+    """
+    Public keys for verifying tokens (JSON Web Key Set), served from memory.
+    Conditional requests with the current ETag get a 304.
+    """
+    body = key_ring.jwks if key_ring is not None else EMPTY_JWKS
+    return HttpResponse(body, content_type='application/json')